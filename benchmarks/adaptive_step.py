@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+"""\
+Usage: adaptive_step.py [--ticks=N] [--warm-up=N] [--macro-ticks=LIST] [--scenario=FILE]
+
+Time the multiple example headless with every number of ticks per step
+in the list, on a scenario where vehicles are far apart, sparse.json next
+to this file by default. Vehicles out of reach of any other are set aside
+while the rest advance tick by tick, so the more of them there are the
+less a tick costs. Prints the wall time of each, how much faster than
+the first it is, how many vehicles there are on average and how many of
+them are set aside, along with the totals and collisions to compare.
+
+Options:
+--ticks=N           Ticks timed [default: 16000]
+--warm-up=N         Ticks run before timing, to fill the road [default: 4000]
+--macro-ticks=LIST  Comma separated ticks per step [default: 1,4,8]
+--scenario=FILE     The scenario to run, see pytraffic.scenario
+"""
+
+import os
+import sys
+import time
+from docopt import docopt
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'pytraffic', 'examples'))
+
+import multiple
+
+from pytraffic.instrument import Instruments
+
+
+SPARSE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sparse.json')
+
+
+def run(macro_ticks, ticks, warm_up, scenario_path):
+    """To get the seconds ticks took, the mean balls, the mean set aside and the model"""
+
+    model = multiple.Simulation(True, 6, seed=0, macro_ticks=macro_ticks,
+                                scenario_path=scenario_path)
+    for _ in range(warm_up // macro_ticks):
+        model.step()
+
+    model.instruments = Instruments()
+    steps = ticks // macro_ticks
+    balls = 0
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        model.step()
+        balls += len(model.balls)
+    seconds = time.perf_counter() - start
+
+    return seconds, balls / steps, model.instruments.counter('balls set aside') / steps, model
+
+
+def main(ticks, warm_up, macro_ticks, scenario_path):
+    print('{:>6} {:>9} {:>8} {:>7} {:>7}  {}'.format('ticks', 'seconds', 'speedup', 'balls',
+                                                     'aside', 'totals and collisions'))
+
+    first = None
+    for number in macro_ticks:
+        seconds, balls, aside, model = run(number, ticks, warm_up, scenario_path)
+        first = first or seconds
+
+        print('{:6} {:9.2f} {:7.2f}x {:7.1f} {:7.1f}  {} {}'.format(
+            number, seconds, first / seconds, balls, aside, model.totals, dict(model.collisions)))
+
+
+if __name__ == '__main__':
+    ARGS = docopt(__doc__)
+
+    main(int(ARGS['--ticks']), int(ARGS['--warm-up']),
+         [int(_) for _ in ARGS['--macro-ticks'].split(',')], ARGS['--scenario'] or SPARSE)
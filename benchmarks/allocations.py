@@ -0,0 +1,251 @@
+#!/usr/bin/python3
+"""\
+Usage: allocations.py [--ticks=N] [--warm-up=N]
+
+Measure with tracemalloc the memory of the small objects the simulation
+creates, comparing slotted classes and tuple returning queries against
+dict backed objects, and the memory allocated while simulating a tick of
+the multiple example, with and without drawing it.
+
+For the tick before, the balls of the example once warmed up are copied
+into dict backed balls, making dict backed points and cones as balls did
+before __slots__ and BallState, and ticked by the same per ball functions
+of the example without a grid. Balls coming in are still shot by the
+shooters of the example and then copied, and the geometry is still worked
+out by the current classes and then copied.
+
+Options:
+--ticks=N     Ticks measured [default: 500]
+--warm-up=N   Ticks run before measuring, to fill the road [default: 1500]
+"""
+
+import os
+import sys
+import math
+import tracemalloc
+from math import pi
+from docopt import docopt
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'pytraffic', 'examples'))
+
+import multiple
+
+from pytraffic.entities import Trajectory
+from pytraffic.entities import Line
+from pytraffic.entities import Arc
+from pytraffic.entities import Point
+from pytraffic.entities import VISIBILITY_APERTURE
+from pytraffic.entities import VISIBILITY_RADII
+
+
+class DictPoint(object):
+    """A point as it was before __slots__"""
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+class DictCone(object):
+    """A visibility cone as it was before __slots__, of dict backed points"""
+
+    def __init__(self, center, visibility_point, aperture):
+        self.center = center
+        self.aperture = aperture
+        self.visibility_point = visibility_point
+        self.visibility_distance = math.hypot(visibility_point.x - center.x,
+                                              visibility_point.y - center.y)
+
+
+    def is_inside_cone(self, point):
+        if point is None:
+            return False
+
+        if math.hypot(point.x - self.center.x, point.y - self.center.y) > self.visibility_distance:
+            return False
+
+        # Both vectors were points as well
+        a = DictPoint(point.x - self.center.x, point.y - self.center.y)
+        b = DictPoint(self.visibility_point.x - self.center.x, self.visibility_point.y - self.center.y)
+
+        norms = math.hypot(a.x, a.y) * math.hypot(b.x, b.y)
+        if not norms:
+            return True
+
+        thetha = math.acos(max(-1.0, min(1.0, (a.x * b.x + a.y * b.y) / norms)))
+
+        return thetha * thetha <= self.aperture
+
+
+class DictBall(object):
+    """A ball as it was before BallState, copied from ball"""
+
+    def __init__(self, ball):
+        self.trajectory = ball.trajectory
+        self.radius = float(ball.radius)
+        self.position = float(ball.position)
+        self.speed = float(ball.speed)
+        self.base_speed = ball.base_speed
+        self.tag = ball.tag
+        self.distances_to = {}
+        self.center = self.__point(self.position)
+
+
+    def __point(self, length):
+        xy = self.trajectory.point_xy(length)
+
+        return None if xy is None else DictPoint(*xy)
+
+
+    @property
+    def center_xy(self):
+        return None if self.center is None else (self.center.x, self.center.y)
+
+
+    def set_speed(self, speed):
+        self.speed = speed
+        if self.base_speed is None:
+            self.base_speed = speed
+
+
+    def move(self, tick):
+        self.position += self.speed * tick
+        self.center = self.__point(self.position)
+
+
+    def can_see(self, ball):
+        cone = self.trajectory.get_tangent_cone(self.position, VISIBILITY_APERTURE,
+                                                VISIBILITY_RADII * self.radius)
+        if cone is None:
+            return False
+
+        cone = DictCone(DictPoint(cone.center.x, cone.center.y),
+                        DictPoint(cone.visibility_point.x, cone.visibility_point.y), cone.aperture)
+
+        return cone.is_inside_cone(ball.center)
+
+
+    def distance_to(self, ball):
+        return math.hypot(self.center.x - ball.center.x, self.center.y - ball.center.y)
+
+
+    def relative_speed_to(self, ball, tick):
+        speed = None
+        current_distance = self.distance_to(ball)
+
+        if ball in self.distances_to:
+            speed = (current_distance - self.distances_to[ball]) / tick
+
+        self.distances_to[ball] = current_distance
+        return speed
+
+
+    def intersects(self, ball):
+        return self.distance_to(ball) < self.radius + ball.radius
+
+
+class DictModel(object):
+    """The balls of model copied into dict backed ones, ticked as before"""
+
+    def __init__(self, model):
+        self.model = model
+        self.speed_up = model.speed_up
+        self.balls = [DictBall(_) for _ in model.balls]
+
+
+    def step(self):
+        model = self.model
+
+        for shooter, tag in model.scheduler.advance(multiple.exact_tick_period(self.speed_up)):
+            shot = shooter.shoot()
+            ball = DictBall(shot)
+            model.state.remove(shot)
+
+            if multiple.get_visible_ball(ball, self.balls) is None:
+                ball.tag = tag
+                self.balls.append(ball)
+
+        for ball in self.balls:
+            ball.move(multiple.tick_period(self.speed_up))
+
+        multiple.adjust_speeds(self.balls, self.speed_up)
+        self.balls = multiple.remove_balls_that_exited(self.balls)
+        self.balls = multiple.remove_balls_that_collide(self.balls)
+
+
+def bytes_per_result(make, number=10000):
+    """To get the bytes retained by each result of make()"""
+
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+
+    results = [make() for _ in range(number)]
+
+    size = tracemalloc.get_traced_memory()[0] - start - sys.getsizeof(results)
+    tracemalloc.stop()
+
+    return size / number
+
+
+def bytes_per_tick(model, ticks, screen=None, background=None):
+    """To get the mean peak of memory allocated on top of the live one per tick"""
+
+    tracemalloc.start()
+    total = 0
+
+    for _ in range(ticks):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+        model.step()
+        if screen is not None:
+            model.render(screen, background)
+
+        total += tracemalloc.get_traced_memory()[1] - current
+
+    tracemalloc.stop()
+
+    return total / ticks
+
+
+def main(ticks, warm_up):
+    trajectory = Trajectory(Line(Point(0, 69.18), Point(98.76, 69.18)),
+                            Arc(Point(98.76, 65.88), 3.5, (3*pi/2, 2*pi)),
+                            Line(Point(101.76, 65.88), Point(101.76, 0)))
+
+    print('Bytes per object:')
+    for name, make in [('dict backed point', lambda: DictPoint(1.0, 2.0)),
+                       ('slotted Point', lambda: Point(1.0, 2.0)),
+                       ('Trajectory.point', lambda: trajectory.point(100.0)),
+                       ('Trajectory.point_xy', lambda: trajectory.point_xy(100.0))]:
+        print('  {:22} {:8.1f}'.format(name, bytes_per_result(make)))
+
+    import pygame
+    pygame.init()
+    multiple.load_font()
+
+    screen = pygame.Surface(multiple.SCREEN_SIZE)
+    background = pygame.Surface(multiple.SCREEN_SIZE)
+
+    print('Bytes allocated per tick, over {} ticks:'.format(ticks))
+    for name, drawing in [('before, dict backed', None), ('headless', False), ('drawing', True)]:
+        model = multiple.Simulation(True, 6, seed=0)
+        for _ in range(warm_up):
+            model.step()
+
+        if drawing is None:
+            model = DictModel(model)
+            size = bytes_per_tick(model, ticks)
+        elif drawing:
+            size = bytes_per_tick(model, ticks, screen, background)
+        else:
+            size = bytes_per_tick(model, ticks)
+
+        print('  {:22} {:8.0f}  ({} balls)'.format(name, size, len(model.balls)))
+
+
+if __name__ == '__main__':
+    ARGS = docopt(__doc__)
+
+    main(int(ARGS['--ticks']), int(ARGS['--warm-up']))
@@ -0,0 +1,125 @@
+#!/usr/bin/python3
+"""\
+Usage: geometry.py [--number=N]
+
+Micro-benchmarks of the per-call cost of Line and Arc queries, comparing
+the precompiled segments in pytraffic.entities against the implementation
+that derived the geometry again on every call.
+
+Options:
+--number=N   Calls per measurement [default: 200000]
+"""
+
+import math
+import timeit
+from docopt import docopt
+
+from pytraffic.entities import Line
+from pytraffic.entities import Arc
+from pytraffic.entities import Point
+from pytraffic.entities import VisibilityCone
+
+
+class ReferenceLine(object):
+    """Line as it was before segments were precompiled"""
+
+    def __init__(self, point_a, point_b):
+        self.point_a = point_a
+        self.point_b = point_b
+
+
+    def distance(self):
+        x_b = self.point_b.x
+        x_a = self.point_a.x
+        y_b = self.point_b.y
+        y_a = self.point_a.y
+
+        return math.sqrt((x_b-x_a)*(x_b-x_a) + (y_b-y_a)*(y_b-y_a))
+
+
+    def point(self, length):
+        cos = (self.point_b.x - self.point_a.x)/self.distance()
+        sin = (self.point_b.y - self.point_a.y)/self.distance()
+
+        return Point(cos * length + self.point_a.x, sin * length + self.point_a.y)
+
+
+    def get_tangent_cone(self, length, aperture, distance):
+        return VisibilityCone(self.point(length), self.point(length + distance), aperture)
+
+
+class ReferenceArc(object):
+    """Arc as it was before segments were precompiled"""
+
+    def __init__(self, center, radius, arc):
+        self.center = center
+        self.radius = radius
+        self.arc = arc
+
+
+    def distance(self):
+        return math.sqrt(((self.arc[1] - self.arc[0]) * self.radius)**2)
+
+
+    def __thetha(self, length, increase_by=0):
+
+        if self.arc[1] < self.arc[0]:
+            sense = -1
+        else:
+            sense = 1
+
+        return self.arc[0] + sense * ((length / self.radius) + increase_by)
+
+
+    def point(self, length):
+        thetha = self.__thetha(length)
+
+        return Point(self.center.x + self.radius * math.cos(thetha),
+                     self.center.y - self.radius * math.sin(thetha))
+
+
+    def get_tangent_cone(self, length, aperture, distance):
+        center = self.point(length)
+        thetha = self.__thetha(length, math.pi/2)
+
+        far_point = Point(center.x + distance * math.cos(thetha),
+                          center.y - distance * math.sin(thetha))
+
+        return VisibilityCone(center, far_point, aperture)
+
+
+def measure(segment, number):
+    """To get nanoseconds per call of each query on segment"""
+
+    queries = {'distance': lambda: segment.distance(),
+               'point': lambda: segment.point(1.5),
+               'get_tangent_cone': lambda: segment.get_tangent_cone(1.5, 0.1, 18)}
+
+    return {name: 1e9 * min(timeit.repeat(query, number=number, repeat=5)) / number
+            for name, query in queries.items()}
+
+
+def main(number):
+    pairs = [('Line',
+              ReferenceLine(Point(0, 69.18), Point(98.76, 69.18)),
+              Line(Point(0, 69.18), Point(98.76, 69.18))),
+             ('Arc',
+              ReferenceArc(Point(98.76, 65.88), 3.5, (3*math.pi/2, 2*math.pi)),
+              Arc(Point(98.76, 65.88), 3.5, (3*math.pi/2, 2*math.pi)))]
+
+    print('{:5} {:17} {:>14} {:>14} {:>8}'.format('', 'query', 'before ns/call',
+                                                  'after ns/call', 'speedup'))
+
+    for name, reference, segment in pairs:
+        before = measure(reference, number)
+        after = measure(segment, number)
+
+        for query in before:
+            print('{:5} {:17} {:14.1f} {:14.1f} {:7.2f}x'.format(
+                name, query, before[query], after[query], before[query]/after[query]))
+
+
+if __name__ == '__main__':
+    ARGS = docopt(__doc__)
+
+    main(int(ARGS['--number']))
@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+"""\
+Usage: import_time.py [--repeat=N]
+
+Compare how long it takes a fresh interpreter to import the simulation
+core alone against importing it together with the pygame rendering backend.
+
+Options:
+--repeat=N   Interpreters started per measurement [default: 10]
+"""
+
+import sys
+import subprocess
+from docopt import docopt
+
+
+HEADLESS = '''\
+import time
+start = time.perf_counter()
+import pytraffic.entities
+print(time.perf_counter() - start, 'pygame' in sys.modules)
+'''
+
+RENDERING = '''\
+import time
+start = time.perf_counter()
+import pytraffic.entities
+import pytraffic.rendering
+print(time.perf_counter() - start, 'pygame' in sys.modules)
+'''
+
+
+def measure(code, repeat):
+    """To get the best import time over repeat fresh interpreters"""
+
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', 'import sys\n' + code],
+                                check=True, capture_output=True, text=True).stdout.split()
+
+        times.append(float(output[-2]))
+        loaded_pygame = output[-1] == 'True'
+
+    return min(times), loaded_pygame
+
+
+def main(repeat):
+    for name, code in [('headless', HEADLESS), ('rendering', RENDERING)]:
+        seconds, loaded_pygame = measure(code, repeat)
+        print('{:10} {:8.1f} ms  pygame loaded: {}'.format(name, 1000 * seconds, loaded_pygame))
+
+
+if __name__ == '__main__':
+    ARGS = docopt(__doc__)
+
+    main(int(ARGS['--repeat']))
@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+"""\
+Usage: memory_growth.py [--ticks=N] [--samples=N] [--tolerance=KB]
+
+Run the multiple example headless for a long time and check that memory
+stops growing once traffic settles. Balls do not follow leaders, so every
+pair that sees each other is kept track of. Exits with an error if the memory
+traced in the last sample exceeds the one in the middle of the run by
+more than the tolerance.
+
+Options:
+--ticks=N        Ticks to run [default: 60000]
+--samples=N      Times to measure memory along the run [default: 10]
+--tolerance=KB   Growth allowed over the second half of the run [default: 256]
+"""
+
+import os
+import sys
+import tracemalloc
+from docopt import docopt
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'pytraffic', 'examples'))
+
+import multiple
+
+
+def main(ticks, samples, tolerance):
+    model = multiple.Simulation(True, 6, seed=0)
+
+    # Balls in the same lane then see each other, so pairs go through the tracker
+    model.follow_leaders = False
+
+    tracemalloc.start()
+    sizes = []
+
+    print('{:>8} {:>6} {:>6} {:>10}'.format('tick', 'balls', 'pairs', 'traced KB'))
+
+    for sample in range(samples):
+        for _ in range(ticks // samples):
+            model.step()
+
+        size = tracemalloc.get_traced_memory()[0] / 1024
+        sizes.append(size)
+
+        print('{:8} {:6} {:6} {:10.1f}'.format((sample + 1) * (ticks // samples),
+                                               len(model.balls), len(model.state.pairs), size))
+
+    growth = sizes[-1] - sizes[len(sizes) // 2 - 1]
+    print('growth over the second half: {:.1f} KB'.format(growth))
+
+    return growth <= tolerance
+
+
+if __name__ == '__main__':
+    ARGS = docopt(__doc__)
+
+    if not main(int(ARGS['--ticks']), int(ARGS['--samples']), float(ARGS['--tolerance'])):
+        sys.exit(1)
@@ -0,0 +1,292 @@
+#!/usr/bin/python3
+"""\
+Usage: suite.py [--sizes=LIST] [--repeat=N] [--only=NAMES] [--output=FILE]
+       suite.py [--sizes=LIST] [--repeat=N] [--only=NAMES] [--output=FILE] --baseline=FILE [--tolerance=PCT]
+
+Time the hot paths of pytraffic.entities and a full step of the multiple
+example with N vehicles on the road, for every N in sizes. Results are
+printed and, given an output file, written as JSON. Given a baseline, a
+JSON file written before, every result is compared with it and the suite
+exits with an error if any is slower than the tolerance allows.
+
+The query benchmarks make N calls, but poses which takes N lengths at
+once, on the trajectories of the crossing. As the crossing only holds a
+few hundred vehicles, the step benchmark lays out parallel straight lanes
+of LANE meters, as many as it takes to have N vehicles SPACING meters
+apart, none of them overlapping, and times the next tick.
+
+Options:
+--sizes=LIST      Comma separated numbers of vehicles [default: 10,100,1000,10000]
+--repeat=N        Measurements taken, the best one is kept [default: 5]
+--only=NAMES      Comma separated benchmarks to run, all by default
+--output=FILE     Write the results to FILE as JSON
+--baseline=FILE   Compare with the results in FILE
+--tolerance=PCT   How much slower than the baseline is not a regression [default: 20]
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import atexit
+import shutil
+import tempfile
+import platform
+from docopt import docopt
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'pytraffic', 'examples'))
+
+import numpy
+import multiple
+
+from pytraffic.entities import Point
+from pytraffic.entities import VISIBILITY_APERTURE
+
+
+# Meters along every lane of the network and between lanes
+LANE = 1000
+GAP = 5
+
+# Meters between vehicles in a lane, each one up to a meter off, so with
+# a radius of 1 they are always more than two radii apart, and all at the
+# same speed so they do not run into each other in the tick timed
+SPACING = 4
+
+# Where the network files go, and their compiled scenarios next to them
+NETWORKS = tempfile.mkdtemp(prefix='pytraffic-suite-')
+atexit.register(shutil.rmtree, NETWORKS, True)
+
+
+def network(number):
+    """To get the path of a scenario with lanes enough for number vehicles"""
+
+    lanes = max(1, math.ceil(number * SPACING / LANE))
+    path = os.path.join(NETWORKS, 'network-{}.json'.format(lanes))
+
+    if not os.path.exists(path):
+        document = {'world': [LANE, GAP * (lanes + 1)],
+                    'trajectories': {str(_): [{'line': [[0, GAP * (_ + 1)], [LANE, GAP * (_ + 1)]]}]
+                                     for _ in range(lanes)},
+                    'shooters': [{'trajectory': str(_), 'tag': 'coche', 'period': 5,
+                                  'mean': 14, 'deviation': 0, 'color': 'red'}
+                                 for _ in range(lanes)]}
+
+        with open(path, 'w') as file:
+            json.dump(document, file)
+
+    return path
+
+
+def populate(number, seed=0):
+    """To get a Simulation with number vehicles spread along the lanes of a network"""
+
+    rng = numpy.random.default_rng(seed)
+    model = multiple.Simulation(True, 6, seed=seed, scenario_path=network(number))
+    lanes = len(model.shooters)
+
+    for index in range(number):
+        shooter, tag = model.shooters[index % lanes]
+        ball = shooter.shoot()
+        ball.tag = tag
+        model.balls.append(ball)
+        model.leaders.add(ball)
+
+    state = model.state
+    slots = numpy.arange(number) // lanes
+    state.position[:] = slots * SPACING + rng.uniform(0, 1, number)
+    state.update_centers()
+
+    model.grid.rebuild(state.x, state.y)
+    model.leaders.update()
+
+    overlapping, _ = model.grid.intersecting_pairs(state.radius)
+    assert not len(overlapping), '{} vehicles overlap'.format(len(overlapping))
+
+    return model
+
+
+def crossing():
+    """To get a Simulation of the crossing, with no vehicles"""
+
+    return multiple.Simulation(True, 6, seed=0)
+
+
+def best(run, repeat, setup=None):
+    """To get the least seconds run(setup()) took over repeat runs"""
+
+    times = []
+    for _ in range(repeat):
+        argument = setup() if setup is not None else None
+        start = time.perf_counter()
+        run(argument)
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def trajectory_point(number, repeat):
+    model = crossing()
+    trajectory = model.trajectories[0]
+    lengths = numpy.random.default_rng(0).uniform(0, trajectory.distance(), number).tolist()
+
+    def run(_):
+        for length in lengths:
+            trajectory.point(length)
+
+    return best(run, repeat)
+
+
+def get_tangent_cone(number, repeat):
+    model = crossing()
+    trajectory = model.trajectories[0]
+    lengths = numpy.random.default_rng(0).uniform(0, trajectory.distance(), number).tolist()
+
+    def run(_):
+        for length in lengths:
+            trajectory.get_tangent_cone(length, VISIBILITY_APERTURE, 18)
+
+    return best(run, repeat)
+
+
+def poses(number, repeat, spacing=None):
+    model = crossing()
+    trajectory = model.trajectories[0]
+    trajectory.tabulate(spacing)
+    lengths = numpy.random.default_rng(0).uniform(0, trajectory.distance(), number)
+
+    return best(lambda _: trajectory.poses(lengths), repeat)
+
+
+def tabulated_poses(number, repeat):
+    return poses(number, repeat, spacing=0.25)
+
+
+def is_inside_cone(number, repeat):
+    model = crossing()
+    cone = model.trajectories[0].get_tangent_cone(50, VISIBILITY_APERTURE, 18)
+    rng = numpy.random.default_rng(0)
+    points = [Point(x, y) for x, y in zip(rng.uniform(40, 70, number).tolist(),
+                                          rng.uniform(60, 80, number).tolist())]
+
+    def run(_):
+        for point in points:
+            cone.is_inside_cone(point)
+
+    return best(run, repeat)
+
+
+def ball_pairs(number):
+    """To get number pairs of balls, each one with the next"""
+
+    balls = populate(number).balls
+    return list(zip(balls, balls[1:] + balls[:1]))
+
+
+def can_see(number, repeat):
+    pairs = ball_pairs(number)
+
+    def run(_):
+        for ball, other in pairs:
+            ball.can_see(other)
+
+    return best(run, repeat)
+
+
+def intersects(number, repeat):
+    pairs = ball_pairs(number)
+
+    def run(_):
+        for ball, other in pairs:
+            ball.intersects(other)
+
+    return best(run, repeat)
+
+
+def step(number, repeat):
+    return best(lambda model: model.step(), repeat, lambda: populate(number))
+
+
+BENCHMARKS = [('Trajectory.point', trajectory_point),
+              ('Trajectory.get_tangent_cone', get_tangent_cone),
+              ('Trajectory.poses', poses),
+              ('Trajectory.poses tabulated', tabulated_poses),
+              ('VisibilityCone.is_inside_cone', is_inside_cone),
+              ('Ball.can_see', can_see),
+              ('Ball.intersects', intersects),
+              ('Simulation.step', step)]
+
+
+def environment():
+    return {'python': platform.python_version(),
+            'numpy': numpy.__version__,
+            'machine': platform.machine(),
+            'system': platform.system()}
+
+
+def run(sizes, repeat, only=None):
+    """To get a list of results, each with the benchmark, N and seconds"""
+
+    results = []
+
+    for name, benchmark in BENCHMARKS:
+        if only and name not in only:
+            continue
+
+        for number in sizes:
+            seconds = benchmark(number, repeat)
+            results.append({'benchmark': name, 'n': number, 'seconds': seconds})
+
+            print('{:30} {:>6} {:12.3f} ms {:10.3f} us/vehicle'.format(
+                name, number, 1e3 * seconds, 1e6 * seconds / number))
+
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """To print the ratio of results to baseline and get the regressions"""
+
+    before = {(_['benchmark'], _['n']): _['seconds'] for _ in baseline['results']}
+    regressions = []
+
+    print('\n{:30} {:>6} {:>10}'.format('compared with baseline', 'n', 'ratio'))
+
+    for result in results:
+        key = result['benchmark'], result['n']
+        if key not in before:
+            continue
+
+        ratio = result['seconds'] / before[key]
+        slower = ratio > 1 + tolerance / 100
+
+        print('{:30} {:>6} {:9.2f}x{}'.format(key[0], key[1], ratio, '  REGRESSION' if slower else ''))
+
+        if slower:
+            regressions.append(result)
+
+    return regressions
+
+
+def main(sizes, repeat, only, output, baseline, tolerance):
+    results = run(sizes, repeat, only)
+
+    if output:
+        with open(output, 'w') as file:
+            json.dump({'environment': environment(), 'repeat': repeat, 'results': results},
+                      file, indent=2)
+
+    if baseline:
+        with open(baseline) as file:
+            return not compare(results, json.load(file), tolerance)
+
+    return True
+
+
+if __name__ == '__main__':
+    ARGS = docopt(__doc__)
+
+    ONLY = ARGS['--only'].split(',') if ARGS['--only'] else None
+
+    if not main([int(_) for _ in ARGS['--sizes'].split(',')], int(ARGS['--repeat']), ONLY,
+                ARGS['--output'], ARGS['--baseline'], float(ARGS['--tolerance'])):
+        sys.exit(1)
@@ -0,0 +1,99 @@
+"""To save the frames of a simulation without holding it up"""
+
+import os
+import queue
+import threading
+import pygame
+
+
+# pygame 2.1.3 renamed tostring to tobytes
+tobytes = getattr(pygame.image, 'tobytes', None) or pygame.image.tostring
+frombytes = getattr(pygame.image, 'frombytes', None) or pygame.image.fromstring
+
+
+class FrameCapture(object):
+    """To write frames to image files from a pool of background threads
+
+    capture() only copies the raw pixels of the surface, encoding and
+    writing are left to the workers. At most pending frames wait for
+    them: if they fall behind, new frames are dropped and counted rather
+    than making the simulation wait."""
+
+
+    def __init__(self, directory, workers=2, pending=16, name='image{}.jpeg'):
+        self.directory = directory
+        self.name = name
+
+        self.frames = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+        self.__lock = threading.Lock()
+        self.__queue = queue.Queue(maxsize=pending)
+        self.__workers = [threading.Thread(target=self.__work, daemon=True)
+                          for _ in range(workers)]
+
+        for worker in self.__workers:
+            worker.start()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def __work(self):
+        while True:
+            frame = self.__queue.get()
+            if frame is None:
+                return
+
+            number, size, pixels = frame
+
+            try:
+                surface = frombytes(pixels, size, 'RGB')
+                pygame.image.save(surface, os.path.join(self.directory, self.name.format(number)))
+                written, failed = 1, 0
+            # Anything going wrong only loses the frame, a dead worker would block close
+            except Exception:
+                written, failed = 0, 1
+
+            with self.__lock:
+                self.written += written
+                self.failed += failed
+
+
+    def capture(self, surface):
+        """To queue a copy of surface to be saved, False if it was dropped
+
+        Frames are numbered from 1 whether dropped or not, so the
+        numbers of the files written show where frames are missing"""
+
+        self.frames += 1
+
+        try:
+            self.__queue.put_nowait((self.frames, surface.get_size(), tobytes(surface, 'RGB')))
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+        return True
+
+
+    def close(self):
+        """To wait for the queued frames to be written and stop the workers"""
+
+        for _ in self.__workers:
+            self.__queue.put(None)
+
+        for worker in self.__workers:
+            worker.join()
+
+
+    def __str__(self):
+        return '{} frames: {} written, {} dropped, {} failed'.format(self.frames, self.written,
+                                                                     self.dropped, self.failed)
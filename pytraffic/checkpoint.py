@@ -0,0 +1,89 @@
+"""To save named arrays and a header to a file that can be memory mapped
+
+The file starts with MAGIC, then the length of the header as a little
+endian 64 bit integer and the header itself, JSON in UTF-8. Arrays follow,
+raw and each aligned to ALIGNMENT bytes, as listed in the header by name
+with their dtype, shape and offset. Reading maps the file, so arrays are
+only read from disk as they are used."""
+
+import json
+import mmap
+import struct
+import numpy
+
+
+MAGIC = b'PYTRAFFIC\x00\x01\x00'
+ALIGNMENT = 64
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write(path, header, arrays):
+    """To write header, a JSON serialisable dict, and a dict of arrays to path"""
+
+    arrays = {name: numpy.ascontiguousarray(array) for name, array in arrays.items()}
+
+    # Offsets depend on the size of the header, which lists them
+    layout = {name: {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': 0}
+              for name, array in arrays.items()}
+
+    while True:
+        document = json.dumps({'header': header, 'arrays': layout}).encode('utf-8')
+        offset = _aligned(len(MAGIC) + 8 + len(document))
+
+        moved = False
+        for name, array in arrays.items():
+            if layout[name]['offset'] != offset:
+                layout[name]['offset'] = offset
+                moved = True
+            offset = _aligned(offset + array.nbytes)
+
+        if not moved:
+            break
+
+    with open(path, 'wb') as file:
+        file.write(MAGIC)
+        file.write(struct.pack('<Q', len(document)))
+        file.write(document)
+
+        for name, array in arrays.items():
+            file.seek(layout[name]['offset'])
+            file.write(array.tobytes())
+
+
+def read(path, mapped=True):
+    """To get the header and the dict of arrays written to path
+
+    Given mapped, arrays are read only views of the memory mapped file,
+    which stays open while any of them is alive. Otherwise they are
+    read into memory."""
+
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError('{} is not a checkpoint'.format(path))
+
+        size, = struct.unpack('<Q', file.read(8))
+        document = json.loads(file.read(size).decode('utf-8'))
+
+        if mapped:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            file.seek(0)
+            buffer = file.read()
+
+    arrays = {}
+    for name, layout in document['arrays'].items():
+        dtype = numpy.dtype(layout['dtype'])
+        count = int(numpy.prod(layout['shape'], dtype=int))
+
+        # Empty arrays may lie past the end of the file
+        if not count:
+            arrays[name] = numpy.empty(layout['shape'], dtype)
+            continue
+
+        arrays[name] = numpy.frombuffer(buffer, dtype, count,
+                                        layout['offset']).reshape(layout['shape'])
+
+    return document['header'], arrays
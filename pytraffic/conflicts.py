@@ -0,0 +1,150 @@
+"""To find once where trajectories come close enough for balls on them to meet"""
+
+import itertools
+import numpy
+
+from pytraffic.entities import World
+from pytraffic.spatial import SpatialGrid
+
+
+def conflict_intervals(first, second, buffer, spacing=0.25):
+    """To get where first and second come within buffer meters of each other
+
+    Returns a list of pairs of intervals, the lengths along first and the
+    lengths along second, one pair for every stretch of first that is
+    close to second. Both are sampled every spacing meters, and buffer is
+    widened by spacing so no close point is missed in between samples.
+
+    Close samples are found through a SpatialGrid laid over both, so
+    memory grows with the samples and not with their pairs, and not at
+    all when the boxes around both, grown by the buffer, do not overlap."""
+
+    reach = buffer + spacing
+
+    lengths_a = numpy.arange(0, first.distance(), spacing)
+    lengths_b = numpy.arange(0, second.distance(), spacing)
+
+    x_a, y_a = first.points(lengths_a)
+    x_b, y_b = second.points(lengths_b)
+
+    if not len(x_a) or not len(x_b):
+        return []
+
+    if (x_a.min() - reach > x_b.max() or x_b.min() - reach > x_a.max()
+            or y_a.min() - reach > y_b.max() or y_b.min() - reach > y_a.max()):
+        return []
+
+    # Samples of first go before those of second, so in pairs i < j they are i
+    x = numpy.concatenate((x_a, x_b))
+    y = numpy.concatenate((y_a, y_b))
+    left, bottom = x.min(), y.min()
+
+    grid = SpatialGrid(World(x.max() - left, y.max() - bottom), reach)
+    grid.rebuild(x - left, y - bottom)
+
+    # A little farther, to then keep the ones within reach as found by hypot
+    i, j = grid.pairs(reach + spacing)
+    across = (i < len(x_a)) & (j >= len(x_a))
+    i, j = i[across], j[across] - len(x_a)
+
+    close = numpy.hypot(x_a[i] - x_b[j], y_a[i] - y_b[j]) <= reach
+    i, j = i[close], j[close]
+
+    near = numpy.zeros(len(x_a), dtype=bool)
+    near[i] = True
+
+    # Stretches of consecutive samples of first close to second, pairs come sorted by i
+    edges = numpy.flatnonzero(numpy.diff(numpy.concatenate(([0], near.astype(int), [0]))))
+    intervals = []
+
+    for start, end in zip(edges[::2].tolist(), edges[1::2].tolist()):
+        others = j[numpy.searchsorted(i, start):numpy.searchsorted(i, end)]
+
+        intervals.append(((max(0, lengths_a[start] - spacing), lengths_a[end - 1] + spacing),
+                          (max(0, lengths_b[others.min()] - spacing), lengths_b[others.max()] + spacing)))
+
+    return intervals
+
+
+class ConflictZone(object):
+    """Where two trajectories may have balls meet
+
+    first and second are the trajectories, first_interval and
+    second_interval the ranges of lengths along each as (start, end)"""
+
+    __slots__ = ('first', 'second', 'first_interval', 'second_interval')
+
+
+    def __init__(self, first, second, first_interval, second_interval):
+        self.first = first
+        self.second = second
+        self.first_interval = first_interval
+        self.second_interval = second_interval
+
+
+    def __repr__(self):
+        return 'ConflictZone({:.2f}-{:.2f}, {:.2f}-{:.2f})'.format(*self.first_interval,
+                                                                    *self.second_interval)
+
+
+class ConflictMap(object):
+    """The conflict zones between every pair of some trajectories
+
+    Zones are found once, where the trajectories come within buffer meters,
+    and start approach meters earlier along each, so balls heading into
+    them count as well. Then the balls in different trajectories that can
+    meet are only those both within the intervals of one zone.
+
+    Given intervals, a dict of what conflict_intervals got before for
+    pairs of the trajectories, those pairs are not worked out again."""
+
+
+    def __init__(self, trajectories, buffer, approach=0, spacing=0.25, intervals=None):
+        self.trajectories = list(trajectories)
+        self.zones = []
+
+        for first, second in itertools.combinations(self.trajectories, 2):
+            found = None if intervals is None else intervals.get((first, second))
+            if found is None:
+                found = conflict_intervals(first, second, buffer, spacing)
+
+            for interval_a, interval_b in found:
+                self.zones.append(ConflictZone(first, second,
+                                               (interval_a[0] - approach, interval_a[1]),
+                                               (interval_b[0] - approach, interval_b[1])))
+
+
+    def __index(self, trajectory):
+        for i, _ in enumerate(self.trajectories):
+            if _ is trajectory:
+                return i
+
+        return -1
+
+
+    def shared(self, state, i, j):
+        """To tell which pairs of rows i, j of a BallState are within a zone
+
+        Pairs in the same trajectory or in one unknown to the map are
+        always taken to share one, so nothing is missed"""
+
+        known = numpy.array([self.__index(_) for _ in state.trajectories], dtype=int)
+        trajectory_i = known[state.trajectory_id[i]]
+        trajectory_j = known[state.trajectory_id[j]]
+
+        shared = (trajectory_i == trajectory_j) | (trajectory_i < 0) | (trajectory_j < 0)
+
+        position_i = state.position[i]
+        position_j = state.position[j]
+
+        for zone in self.zones:
+            a = self.__index(zone.first)
+            b = self.__index(zone.second)
+
+            for (t_i, interval_i), (t_j, interval_j) in [((a, zone.first_interval), (b, zone.second_interval)),
+                                                         ((b, zone.second_interval), (a, zone.first_interval))]:
+                shared |= ((trajectory_i == t_i) & (trajectory_j == t_j)
+                           & (position_i >= interval_i[0]) & (position_i <= interval_i[1])
+                           & (position_j >= interval_j[0]) & (position_j <= interval_j[1]))
+
+        return shared
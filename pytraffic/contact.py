@@ -0,0 +1,83 @@
+"""To find when balls first touch while moving along their trajectories
+
+Within a tick every ball moves at constant speed along its trajectory,
+from where it was at the start of the tick. Testing only where balls
+end, fast balls may go through each other unnoticed. Here pairs are
+followed over the whole tick by conservative advancement: as centers
+move one meter per meter of trajectory, two balls get closer at most at
+the sum of their speeds, so time can always be advanced by the gap
+between them over that sum without skipping their first contact."""
+
+import numpy
+
+
+def times_of_contact(state, start, tick, i, j, tolerance=1e-3, iterations=64):
+    """To get when, within tick, the balls in rows i first touch those in j
+
+    start holds the positions of all balls at the start of the tick and
+    their speed is taken from state. Balls touch when their centers are
+    closer than the sum of their radii. Times are NaN for the pairs that do
+    not touch, or are still apart after iterations advances.
+
+    Nearly touching balls would only advance by less and less, so every
+    advance lets them get at least tolerance meters closer. Contacts less
+    deep than that may be missed."""
+
+    reach = state.radius[i] + state.radius[j]
+    closing = state.speed[i] + state.speed[j]
+
+    time = numpy.zeros(len(i))
+    contact = numpy.full(len(i), numpy.nan)
+    active = numpy.arange(len(i))
+
+    for _ in range(iterations):
+        if not len(active):
+            break
+
+        a = i[active]
+        b = j[active]
+        t = time[active]
+
+        x_a, y_a = state.centers(start[a] + state.speed[a] * t, a)
+        x_b, y_b = state.centers(start[b] + state.speed[b] * t, b)
+        gap = numpy.hypot(x_a - x_b, y_a - y_b) - reach[active]
+
+        touching = gap < 0
+        contact[active[touching]] = t[touching]
+
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            t = t + numpy.maximum(gap, tolerance) / closing[active]
+
+        # Pairs that exited, stand still or run out of time are apart
+        going = ~touching & (t <= tick)
+        time[active[going]] = t[going]
+        active = active[going]
+
+    return contact
+
+
+def reach(state, tick, tolerance=1e-3):
+    """To get how far apart, at the end of tick, balls touching in it may be
+
+    Their radii plus the distance both travel in the tick"""
+
+    speed = numpy.nan_to_num(state.speed)
+    return 2 * numpy.max(state.radius) + 2 * numpy.max(speed) * tick + tolerance
+
+
+def contacts(state, start, tick, grid, tolerance=1e-3):
+    """To get the pairs of rows i < j whose balls touch within tick, and when
+
+    grid indexes the rows of state by where they are at the end of the
+    tick. Balls touching at some time can be no farther apart at the end
+    than reach."""
+
+    if not state.size:
+        empty = numpy.empty(0, dtype=int)
+        return empty, empty, numpy.empty(0)
+
+    i, j = grid.pairs(reach(state, tick, tolerance))
+    time = times_of_contact(state, start, tick, i, j, tolerance)
+    touching = ~numpy.isnan(time)
+
+    return i[touching], j[touching], time[touching]
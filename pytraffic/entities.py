@@ -1,19 +1,42 @@
-"""Entities to be used to create traffic simulations"""
+"""Entities to be used to create traffic simulations
+
+Nothing here needs pygame, drawing is done by the rendering module
+which is loaded the first time something is rendered"""
 
 import math
-import pygame
+import bisect
+import itertools
+import numpy
 from .colors import BLACK, RED, BLUE
 
 
 def point2pixel(point, world, screen):
     """To Convert a real point in real units to pixel units"""
 
-    pixel_x = screen.get_width() * (point.x / world.width)
-    pixel_y = screen.get_height() * (point.y / world.height)
+    return xy2pixel(point.x, point.y, world, screen)
+
+
+def xy2pixel(x, y, world, screen):
+    """To Convert real coordinates in real units to pixel units"""
+
+    pixel_x = screen.get_width() * (x / world.width)
+    pixel_y = screen.get_height() * (y / world.height)
 
     return pixel_x, pixel_y
 
 
+# Visibility cones of balls, aperture and how far they reach in radii
+VISIBILITY_APERTURE = 0.1
+VISIBILITY_RADII = 18
+
+
+def backend():
+    """To get the rendering backend, importing pygame on first use"""
+
+    from . import rendering
+    return rendering
+
+
 def dot_product(vector_a, vector_b):
     return vector_a.x * vector_b.x + vector_a.y * vector_b.y
 
@@ -30,9 +53,72 @@ def angle(vector_a, vector_b):
     return math.acos(dot_product(vector_a, vector_b)/(magnitude(vector_a)*magnitude(vector_b)))
 
 
+def inside_cones(center_x, center_y, heading_x, heading_y, aperture, reach, x, y):
+    """To check at once if points are inside cones, element by element
+
+    All arguments are arrays that broadcast together. Cones are given by
+    their center, heading vector, aperture and reach, like VisibilityCone,
+    and so is the result. The angle is compared through the dot and cross
+    products, that is without acos. NaN points are never inside and the
+    center of a cone is inside it."""
+
+    dx = x - center_x
+    dy = y - center_y
+
+    near = dx*dx + dy*dy <= reach*reach
+
+    # The angle between d and the heading is at most sqrt(aperture) if
+    # |cross| * cos(sqrt(aperture)) <= dot * sin(sqrt(aperture))
+    limit = numpy.minimum(numpy.sqrt(aperture), math.pi)
+    dot = dx*heading_x + dy*heading_y
+    cross = numpy.abs(dx*heading_y - dy*heading_x)
+
+    return near & (cross * numpy.cos(limit) <= dot * numpy.sin(limit))
+
+
+def visibility_matrix(center_x, center_y, heading_x, heading_y, aperture, reach, x, y):
+    """To get matrix[i, j], telling if cone i sees point j
+
+    Cones are given by arrays as in inside_cones, points by arrays x, y"""
+
+    def column(_):
+        return numpy.asarray(_, dtype=float).reshape(-1, 1)
+
+    return inside_cones(column(center_x), column(center_y),
+                        column(heading_x), column(heading_y),
+                        column(aperture), column(reach),
+                        numpy.asarray(x, dtype=float)[None, :],
+                        numpy.asarray(y, dtype=float)[None, :])
+
+
+def visible_pairs(center_x, center_y, heading_x, heading_y, aperture, reach, x, y, i, j):
+    """To get the pairs (i, j), from those given, where cone i sees point j
+
+    Cones are given by arrays as in inside_cones, points by arrays x, y.
+    Only the candidate pairs are tested, so n cones are not tested
+    against all n points."""
+
+    i = numpy.asarray(i, dtype=int)
+    j = numpy.asarray(j, dtype=int)
+
+    def take(_, index):
+        _ = numpy.asarray(_, dtype=float)
+        return _ if _.ndim == 0 else _[index]
+
+    seen = inside_cones(take(center_x, i), take(center_y, i),
+                        take(heading_x, i), take(heading_y, i),
+                        take(aperture, i), take(reach, i),
+                        take(x, j), take(y, j))
+
+    return i[seen], j[seen]
+
+
 class World(object):
     """To contain global simulation data"""
 
+    __slots__ = ('width', 'height')
+
+
     def __init__(self, width, height):
         self.width = width
         self.height = height
@@ -41,14 +127,72 @@ class World(object):
 class Point(object):
     """A point is defined in real units, meters"""
 
+    __slots__ = ('x', 'y')
+
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
 
 
     def render(self, world, screen):
-        pixel_x, pixel_y = point2pixel(self, world, screen)
-        pygame.draw.line(screen, BLACK, [pixel_x, pixel_y], [pixel_x, pixel_y], 1)
+        return backend().render_point(self, world, screen)
+
+
+class FrozenGeometry(object):
+    """Base of the immutable records segments are compiled into"""
+
+    __slots__ = ()
+
+
+    def __init__(self, **values):
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{} is immutable'.format(type(self).__name__))
+
+
+    def __delattr__(self, name):
+        raise AttributeError('{} is immutable'.format(type(self).__name__))
+
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__,
+                               ', '.join('{}={!r}'.format(_, getattr(self, _))
+                                         for _ in self.__slots__))
+
+
+class LineGeometry(FrozenGeometry):
+    """A line from (x, y) along the unit direction (cos, sin)"""
+
+    __slots__ = ('x', 'y', 'cos', 'sin', 'length')
+
+
+    def __init__(self, point_a, point_b):
+        dx = point_b.x - point_a.x
+        dy = point_b.y - point_a.y
+        length = math.sqrt(dx*dx + dy*dy)
+
+        # A line of no length goes nowhere, trajectories never land on it anyway
+        cos, sin = (dx/length, dy/length) if length else (0.0, 0.0)
+
+        super().__init__(x=point_a.x, y=point_a.y, cos=cos, sin=sin, length=length)
+
+
+class ArcGeometry(FrozenGeometry):
+    """An arc around (x, y) starting at angle start and turning by sense"""
+
+    __slots__ = ('x', 'y', 'radius', 'start', 'sense', 'length')
+
+
+    def __init__(self, center, radius, arc):
+        sense = -1 if arc[1] < arc[0] else 1
+
+        super().__init__(x=center.x, y=center.y, radius=radius,
+                         start=arc[0], sense=sense,
+                         length=abs((arc[1] - arc[0]) * radius))
 
 
 class Line(object):
@@ -58,37 +202,56 @@ class Line(object):
         self.point_a = point_a
         self.point_b = point_b
         self.color = color
+        self.geometry = LineGeometry(point_a, point_b)
 
 
     def render(self, world, screen):
-        pixel_a_x, pixel_a_y = point2pixel(self.point_a, world, screen)
-        pixel_b_x, pixel_b_y = point2pixel(self.point_b, world, screen)
-
-        pygame.draw.line(screen, self.color, [pixel_a_x, pixel_a_y], [pixel_b_x, pixel_b_y], 1)
+        return backend().render_line(self, world, screen)
 
 
     def distance(self):
-        x_b = self.point_b.x
-        x_a = self.point_a.x
-        y_b = self.point_b.y
-        y_a = self.point_a.y
-
-        return math.sqrt((x_b-x_a)*(x_b-x_a) + (y_b-y_a)*(y_b-y_a))
+        return self.geometry.length
 
 
     def point(self, length):
         """To get the point at length along the curve"""
 
-        cos = (self.point_b.x - self.point_a.x)/self.distance()
-        sin = (self.point_b.y - self.point_a.y)/self.distance()
+        geometry = self.geometry
+
+        return Point(geometry.x + geometry.cos * length,
+                     geometry.y + geometry.sin * length)
+
+
+    def point_xy(self, length):
+        """To get the coordinates at length along the curve as a tuple"""
 
-        dx = cos * length
-        dy = sin * length
+        geometry = self.geometry
 
-        x = dx + self.point_a.x
-        y = dy + self.point_a.y
+        return (geometry.x + geometry.cos * length,
+                geometry.y + geometry.sin * length)
 
-        return Point(x, y)
+
+    def points(self, lengths):
+        """To get the coordinates at an array of lengths along the curve"""
+
+        geometry = self.geometry
+
+        return geometry.x + geometry.cos * lengths, geometry.y + geometry.sin * lengths
+
+
+    def headings(self, lengths):
+        """To get the unit tangent vectors at an array of lengths along the curve"""
+
+        lengths = numpy.asarray(lengths, dtype=float)
+
+        return (numpy.full(lengths.shape, self.geometry.cos),
+                numpy.full(lengths.shape, self.geometry.sin))
+
+
+    def poses(self, lengths):
+        """To get the coordinates and unit tangent vectors at an array of lengths"""
+
+        return self.points(lengths) + self.headings(lengths)
 
 
     def get_tangent_cone(self, length, aperture, distance):
@@ -112,45 +275,67 @@ class Arc(object):
         self.radius = radius
         self.arc = arc
         self.color = color
+        self.geometry = ArcGeometry(center, radius, arc)
 
 
     def render(self, world, screen):
-        p_a = Point(self.center.x - self.radius, self.center.y - self.radius)
+        return backend().render_arc(self, world, screen)
 
-        x, y = point2pixel(p_a, world, screen)
-        dx, dy = point2pixel(Point(2 * self.radius, 2 * self.radius), world, screen)
 
-        if self.arc[1] < self.arc[0]:
-            arc = self.arc[1], self.arc[0]
-        else:
-            arc = self.arc
+    def distance(self):
+        return self.geometry.length
 
-        pygame.draw.arc(screen, self.color, [x, y, dx, dy], *arc, 1)
 
+    def point(self, length):
+        """To get the point at length along the curve"""
 
-    def distance(self):
-        return math.sqrt(((self.arc[1] - self.arc[0]) * self.radius)**2)
+        geometry = self.geometry
+        thetha = geometry.start + geometry.sense * (length / geometry.radius)
 
+        return Point(geometry.x + geometry.radius * math.cos(thetha),
+                     geometry.y - geometry.radius * math.sin(thetha))
 
-    def __thetha(self, length, increase_by=0):
 
-        if self.arc[1] < self.arc[0]:
-            sense = -1
-        else:
-            sense = 1
+    def point_xy(self, length):
+        """To get the coordinates at length along the curve as a tuple"""
 
-        return self.arc[0] + sense * ((length / self.radius) + increase_by)
+        geometry = self.geometry
+        thetha = geometry.start + geometry.sense * (length / geometry.radius)
 
+        return (geometry.x + geometry.radius * math.cos(thetha),
+                geometry.y - geometry.radius * math.sin(thetha))
 
-    def point(self, length):
-        """To get the point at length along the curve"""
 
-        thetha = self.__thetha(length)
+    def points(self, lengths):
+        """To get the coordinates at an array of lengths along the curve"""
+
+        geometry = self.geometry
+        thetha = geometry.start + geometry.sense * (lengths / geometry.radius)
+
+        return (geometry.x + geometry.radius * numpy.cos(thetha),
+                geometry.y - geometry.radius * numpy.sin(thetha))
 
-        x = self.center.x + self.radius * math.cos(thetha)
-        y = self.center.y - self.radius * math.sin(thetha)
 
-        return Point(x, y)
+    def headings(self, lengths):
+        """To get the unit tangent vectors at an array of lengths along the curve"""
+
+        geometry = self.geometry
+        thetha = geometry.start + geometry.sense * (lengths / geometry.radius + math.pi/2)
+
+        return numpy.cos(thetha), -numpy.sin(thetha)
+
+
+    def poses(self, lengths):
+        """To get the coordinates and unit tangent vectors at an array of lengths"""
+
+        geometry = self.geometry
+        thetha = geometry.start + geometry.sense * (lengths / geometry.radius)
+        cos = numpy.cos(thetha)
+        sin = numpy.sin(thetha)
+
+        # The tangent is the radius turned a quarter in the sense of the arc
+        return (geometry.x + geometry.radius * cos, geometry.y - geometry.radius * sin,
+                -geometry.sense * sin, -geometry.sense * cos)
 
 
     def get_tangent_cone(self, length, aperture, distance):
@@ -158,11 +343,14 @@ class Arc(object):
 
         The cone is as large as given by distance"""
 
-        center = self.point(length)
-        thetha = self.__thetha(length, math.pi/2)
+        geometry = self.geometry
+        thetha = geometry.start + geometry.sense * (length / geometry.radius)
+        heading = thetha + geometry.sense * math.pi/2
 
-        far_point = Point(center.x + distance * math.cos(thetha),
-                          center.y - distance * math.sin(thetha))
+        center = Point(geometry.x + geometry.radius * math.cos(thetha),
+                       geometry.y - geometry.radius * math.sin(thetha))
+        far_point = Point(center.x + distance * math.cos(heading),
+                          center.y - distance * math.sin(heading))
 
         return VisibilityCone(center, far_point, aperture)
 
@@ -174,6 +362,13 @@ class Trajectory(object):
     def __init__(self, *segments):
         self.segments = segments
 
+        # Segments do not change, so cache where each one starts and ends
+        self.__ends = list(itertools.accumulate(_.distance() for _ in segments))
+        self.__starts = [0] + self.__ends[:-1]
+        self.__ends_array = numpy.array(self.__ends)
+        self.__starts_array = numpy.array(self.__starts)
+        self.__table = None
+
 
     def render(self, world, screen):
         for obj in self.segments:
@@ -181,29 +376,18 @@ class Trajectory(object):
 
 
     def distance(self):
-        distance = 0
-        for _ in self.segments:
-            distance += _.distance()
-
-        return distance
+        return self.__ends[-1] if self.__ends else 0
 
 
     def __segment(self, length):
         """To get segment and its initial position where length along trajectory lies"""
 
-        distance_a = 0
-        distance_b = 0
-
-        segment = None
+        i = bisect.bisect_right(self.__ends, length)
 
-        for _ in self.segments:
-            distance_b += _.distance()
-            if length < distance_b:
-                segment = _
-                break
-            distance_a = distance_b
+        if i == len(self.segments):
+            return None, self.distance()
 
-        return segment, distance_a
+        return self.segments[i], self.__starts[i]
 
 
     def point(self, length):
@@ -217,6 +401,156 @@ class Trajectory(object):
         return segment.point(length-distance_a)
 
 
+    def point_xy(self, length):
+        """To get the coordinates at length along trajectory as a tuple, or None"""
+
+        segment, distance_a = self.__segment(length)
+
+        if segment is None:
+            return None
+
+        return segment.point_xy(length-distance_a)
+
+
+    def tabulate(self, spacing=None):
+        """To answer the array queries out of a lookup table, or exactly
+
+        Given spacing, every segment is sampled evenly at most every
+        spacing meters, ends included, and poses are interpolated in
+        between with no trigonometry nor per segment passes. Without it,
+        as at first, each segment works out its own lengths exactly."""
+
+        if spacing is None:
+            self.__table = None
+            return
+
+        counts = [max(2, math.ceil(_.distance() / spacing) + 1) for _ in self.segments]
+        offsets = numpy.cumsum([0] + counts[:-1])
+        steps = numpy.array([_.distance() / (count - 1)
+                             for _, count in zip(self.segments, counts)])
+
+        samples = [segment.poses(numpy.linspace(0, segment.distance(), count))
+                   for segment, count in zip(self.segments, counts)]
+
+        poses = numpy.array([numpy.concatenate(_) for _ in zip(*samples)])
+
+        self.__table = offsets, steps, numpy.array(counts), poses
+
+
+    def table(self):
+        """To get the lookup table tabulate made, or None, see set_table"""
+
+        return self.__table
+
+
+    def set_table(self, table):
+        """To answer the array queries out of a table got from table()
+
+        As made by tabulate for this trajectory, read only arrays such as
+        memory mapped ones will do. None goes back to exact answers."""
+
+        self.__table = None if table is None else tuple(table)
+
+
+    def __per_segment(self, lengths, query, count, out=None):
+        """To answer a query of the segments for an array of lengths
+
+        The query returns count arrays, NaN past the end of the trajectory,
+        which are written into out if it is given"""
+
+        lengths = numpy.asarray(lengths, dtype=float)
+        index = numpy.searchsorted(self.__ends_array, lengths, side='right')
+
+        if out is None:
+            out = tuple(numpy.full(lengths.shape, numpy.nan) for _ in range(count))
+        else:
+            for _ in out:
+                _.fill(numpy.nan)
+
+        for i, segment in enumerate(self.segments):
+            mask = index == i
+            if mask.any():
+                for array, values in zip(out, getattr(segment, query)(lengths[mask] - self.__starts[i])):
+                    array[mask] = values
+
+        return tuple(out)
+
+
+    def __interpolated(self, lengths, columns, out=None):
+        """To answer a query out of the lookup table, see tabulate
+
+        columns are the rows of the table wanted: x, y, heading x, heading y"""
+
+        lengths = numpy.asarray(lengths, dtype=float)
+        offsets, steps, counts, poses = self.__table
+
+        index = numpy.searchsorted(self.__ends_array, lengths, side='right')
+        past = index == len(self.segments)
+        index = numpy.where(past, 0, index)
+
+        # Samples are evenly spread within a segment, so no search is needed
+        step = (lengths - self.__starts_array[index]) / steps[index]
+        sample = numpy.clip(numpy.floor(step), 0, counts[index] - 2)
+        weight = step - sample
+        first = offsets[index] + sample.astype(int)
+
+        if out is None:
+            out = tuple(numpy.empty(lengths.shape) for _ in columns)
+
+        for array, column in zip(out, columns):
+            values = poses[column - 1]
+            a = values[first]
+            array[...] = a + weight * (values[first + 1] - a)
+            array[past] = numpy.nan
+
+        # Headings are averaged, so back to unit length
+        if columns[0] == 3:
+            norm = numpy.hypot(out[0], out[1])
+            out[0][...] /= norm
+            out[1][...] /= norm
+
+        return tuple(out)
+
+
+    def points(self, lengths, out=None):
+        """To get the coordinates of an array of lengths along trajectory
+
+        Returns two arrays, x and y, holding NaN past the end. Given out,
+        a pair of arrays shaped as lengths, they are filled and returned."""
+
+        if self.__table is not None:
+            return self.__interpolated(lengths, (1, 2), out)
+
+        return self.__per_segment(lengths, 'points', 2, out)
+
+
+    def headings(self, lengths, out=None):
+        """To get the unit tangent vectors at an array of lengths along trajectory
+
+        Returns two arrays, x and y components, holding NaN past the end.
+        Given out, a pair of arrays shaped as lengths, they are filled."""
+
+        if self.__table is not None:
+            return self.__interpolated(lengths, (3, 4), out)
+
+        return self.__per_segment(lengths, 'headings', 2, out)
+
+
+    def poses(self, lengths, out=None):
+        """To get where and which way the trajectory goes at an array of lengths
+
+        Returns four arrays: x, y and the x and y components of the unit
+        tangent vector, all NaN past the end, so numpy.isnan(x) masks the
+        lengths off the trajectory. Given out, four arrays shaped as
+        lengths, they are filled and returned."""
+
+        if self.__table is not None:
+            return (self.__interpolated(lengths, (1, 2), None if out is None else out[:2])
+                    + self.__interpolated(lengths, (3, 4), None if out is None else out[2:]))
+
+        return self.__per_segment(lengths, 'poses', 4, out)
+
+
     def get_tangent_cone(self, length, aperture, distance):
         """Given a position by length in the trajectory return a tangent cone
 
@@ -233,6 +567,9 @@ class Trajectory(object):
 class VisibilityCone(object):
     """A cone of visibility"""
 
+    __slots__ = ('center', 'aperture', 'visibility_point', 'visibility_distance')
+
+
     def __init__(self, center_point, visibility_point, aperture):
         self.center = center_point
         self.aperture = aperture
@@ -245,21 +582,32 @@ class VisibilityCone(object):
         # in the complex plane, then take first order approximation
         # in alpha to derive the following formula
 
-        return Point(point.x - (point.y - self.center.y) * alpha,
-                     point.y + (point.x - self.center.x) * alpha)
+        return (point.x - (point.y - self.center.y) * alpha,
+                point.y + (point.x - self.center.x) * alpha)
 
 
     def is_inside_cone(self, point):
-        # First check distance to center_point
         if point is None:
             return False
 
-        if distance(point, self.center) > self.visibility_distance:
+        return self.is_inside_xy(point.x, point.y)
+
+
+    def is_inside_xy(self, x, y):
+        """As is_inside_cone, for a point given by its coordinates"""
+
+        # First check distance to center_point
+        dx = x - self.center.x
+        dy = y - self.center.y
+        distance_to_center = math.sqrt(dx**2 + dy**2)
+
+        if distance_to_center > self.visibility_distance:
             return False
 
         # Next check the angle
-        thetha = angle(Point(point.x-self.center.x, point.y-self.center.y),
-                       Point(self.visibility_point.x-self.center.x, self.visibility_point.y-self.center.y))
+        vx = self.visibility_point.x - self.center.x
+        vy = self.visibility_point.y - self.center.y
+        thetha = math.acos((dx*vx + dy*vy)/(distance_to_center*math.sqrt(vx**2 + vy**2)))
 
         if thetha*thetha > self.aperture:
             return False
@@ -267,31 +615,445 @@ class VisibilityCone(object):
         return True
 
 
-    def render(self, world, screen, color=BLUE):
+    def outline_xy(self):
+        """To get the corners of the cone as drawn, as tuples of coordinates"""
+
         _c1 = self.__rotate_about_center_by_small_alpha(self.visibility_point, self.aperture/2)
         _c2 = self.__rotate_about_center_by_small_alpha(self.visibility_point, -self.aperture/2)
 
-        pygame.draw.polygon(screen,
-                            color,
-                            list(map(lambda l: point2pixel(l, world, screen),
-                                     (self.center, _c1, self.visibility_point, _c2))),
-                            1)
+        return ((self.center.x, self.center.y), _c1,
+                (self.visibility_point.x, self.visibility_point.y), _c2)
+
+
+    def outline(self):
+        """To get the corners of the cone as drawn"""
+
+        return tuple(Point(*_) for _ in self.outline_xy())
+
+
+    def render(self, world, screen, color=BLUE):
+        return backend().render_cone(self, world, screen, color)
+
+
+class PairTracker(object):
+    """Last distances between pairs of balls that see each other
+
+    Pairs are keyed by ball serial numbers, so no ball is kept alive.
+    An entry lasts while the pair keeps seeing each other: those not
+    refreshed during a tick are dropped at the end of the next one,
+    and those of a removed ball are dropped at once."""
+
+    def __init__(self):
+        self.__current = {}  # distances measured this tick
+        self.__last = {}     # distances measured last tick
+
+
+    def __len__(self):
+        return len(self.__current.keys() | self.__last.keys())
+
+
+    def relative_speed(self, key, distance, tick):
+        """To record distance for key and get how fast it changed since last tick"""
+
+        speed = None
+
+        last_distance = self.__current.get(key, self.__last.get(key))
+        if last_distance is not None:
+            speed = (distance - last_distance)/tick
+
+        self.__current[key] = distance
+        return speed
+
+
+    def end_tick(self):
+        """To drop the pairs that were not seen during the last tick"""
+
+        self.__last = self.__current
+        self.__current = {}
+
+
+    def distances(self):
+        """To get copies of the distances measured this tick and last tick"""
+
+        return dict(self.__current), dict(self.__last)
+
+
+    def set_distances(self, current, last):
+        """To replace the distances measured this tick and last tick"""
+
+        self.__current = dict(current)
+        self.__last = dict(last)
+
+
+    def forget(self, serials):
+        """To drop every pair involving any of the given ball serials"""
+
+        serials = set(serials)
+
+        for distances in (self.__current, self.__last):
+            for key in [_ for _ in distances if _[0] in serials or _[1] in serials]:
+                del distances[key]
+
+
+def end_tick(balls):
+    """To end the tick of balls moved one by one, see PairTracker.end_tick
+
+    BallState.move ends it for all the balls it moves, balls moved on
+    their own, each in a state of its own, need this once every tick"""
+
+    for state in {id(_.state): _.state for _ in balls}.values():
+        state.pairs.end_tick()
+
+
+class BallState(object):
+    """A structure of arrays holding the state of many balls
+
+    Every ball is a row in the arrays. Ball objects are thin views
+    over one row, so a whole population can be moved at once"""
+
+    COLUMNS = ('position', 'speed', 'base_speed', 'radius', 'x', 'y', 'heading_x', 'heading_y')
+
+
+    def __init__(self, capacity=64):
+        self.size = 0
+        self.balls = []
+        self.trajectories = []
+        self.pairs = PairTracker()
+
+        self.__columns = {}
+        for name in self.COLUMNS:
+            self.__columns[name] = numpy.full(capacity, numpy.nan)
+        self.__columns['trajectory_id'] = numpy.zeros(capacity, dtype=int)
+        self.__columns['serial'] = numpy.zeros(capacity, dtype=int)
+
+
+    def __getattr__(self, name):
+        # Only called when normal lookup fails, that is for the columns
+        if name in BallState.COLUMNS or name in ('trajectory_id', 'serial'):
+            return self.__columns[name][:self.size]
+
+        raise AttributeError(name)
+
+
+    def __len__(self):
+        return self.size
+
+
+    def __grow(self):
+        for name, column in self.__columns.items():
+            grown = numpy.resize(column, 2 * len(column))
+            grown[self.size:] = numpy.nan if column.dtype.kind == 'f' else 0
+            self.__columns[name] = grown
+
+
+    def __trajectory_id(self, trajectory):
+        for i, _ in enumerate(self.trajectories):
+            if _ is trajectory:
+                return i
+
+        self.trajectories.append(trajectory)
+        return len(self.trajectories) - 1
+
+
+    def add(self, ball, radius, trajectory):
+        """To add a row for ball and return its index"""
+
+        if self.size == len(self.__columns['position']):
+            self.__grow()
+
+        index = self.size
+        self.size += 1
+        self.balls.append(ball)
+
+        columns = self.__columns
+        columns['position'][index] = 0
+        columns['speed'][index] = 0
+        columns['base_speed'][index] = numpy.nan
+        columns['radius'][index] = radius
+        columns['trajectory_id'][index] = self.__trajectory_id(trajectory)
+        columns['serial'][index] = ball.serial
+        self.update_center(index)
+
+        return index
+
+
+    def __detach(self, ball):
+        """To move the row of ball into a private state of its own"""
+
+        index = ball.index
+
+        detached = BallState(1)
+        detached.add(ball, self.radius[index], self.trajectory(index))
+        for name in self.COLUMNS:
+            getattr(detached, name)[0] = getattr(self, name)[index]
+
+        ball.state = detached
+        ball.index = 0
+
+
+    def retain(self, balls):
+        """To remove every row whose ball is not in balls
+
+        Removed balls keep a private copy of their row and the
+        remaining rows keep their relative order"""
+
+        keep = set(id(_) for _ in balls)
+        rows = [i for i, _ in enumerate(self.balls) if id(_) in keep]
+
+        if len(rows) == self.size:
+            return
+
+        removed = [_ for _ in self.balls if id(_) not in keep]
+        for ball in removed:
+            self.__detach(ball)
+
+        self.pairs.forget(_.serial for _ in removed)
+        self.__keep(rows)
+
+
+    def __keep(self, rows):
+        """To keep only the rows given, in that order"""
+
+        for column in self.__columns.values():
+            column[:len(rows)] = column[rows]
+
+        self.balls = [self.balls[_] for _ in rows]
+        for index, ball in enumerate(self.balls):
+            ball.index = index
+
+        self.size = len(rows)
+
+
+    def remove(self, ball):
+        """To remove the row of a ball, the ball keeps a private copy of it"""
+
+        self.retain([_ for _ in self.balls if _ is not ball])
+
+
+    def split(self, rows):
+        """To move the rows given into a BallState of their own and get it
+
+        Their balls go along with them and the pairs they are in are
+        forgotten, the remaining rows keep their relative order. See merge
+        to move them back."""
+
+        rows = numpy.asarray(rows, dtype=int)
+
+        other = BallState(max(1, len(rows)))
+        other.trajectories = list(self.trajectories)
+        for name, column in self.__columns.items():
+            other.__columns[name][:len(rows)] = column[rows]
+
+        other.size = len(rows)
+        other.balls = [self.balls[_] for _ in rows.tolist()]
+        for index, ball in enumerate(other.balls):
+            ball.state = other
+            ball.index = index
+
+        kept = numpy.ones(self.size, dtype=bool)
+        kept[rows] = False
+
+        self.pairs.forget(_.serial for _ in other.balls)
+        self.__keep(numpy.flatnonzero(kept))
+
+        return other
+
+
+    def merge(self, other):
+        """To move every row of other, along with its ball, into this state
+
+        Rows end up in the order of the serial numbers of their balls, the
+        order balls are made in, so the rows split off go back in place."""
+
+        if not other.size:
+            return
+
+        size = self.size + other.size
+        while len(self.__columns['position']) < size:
+            self.__grow()
+
+        ids = numpy.array([self.__trajectory_id(_) for _ in other.trajectories], dtype=int)
+        order = numpy.argsort(numpy.concatenate((self.serial, other.serial)), kind='stable')
+
+        for name, column in self.__columns.items():
+            values = other.__columns[name][:other.size]
+            if name == 'trajectory_id':
+                values = ids[values]
+
+            column[:size] = numpy.concatenate((column[:self.size], values))[order]
+
+        balls = self.balls + other.balls
+        self.balls = [balls[_] for _ in order.tolist()]
+        for index, ball in enumerate(self.balls):
+            ball.state = self
+            ball.index = index
+
+        self.size = size
+
+        other.balls = []
+        other.size = 0
+
+
+    def trajectory(self, index):
+        return self.trajectories[self.trajectory_id[index]]
+
+
+    def update_center(self, index):
+        x, y, heading_x, heading_y = self.trajectory(index).poses(self.position[index:index + 1])
+
+        self.x[index] = x[0]
+        self.y[index] = y[0]
+        self.heading_x[index] = heading_x[0]
+        self.heading_y[index] = heading_y[0]
+
+
+    def update_centers(self):
+        """To recompute the centers and headings of all balls, in one pass per trajectory"""
+
+        position = self.position
+        trajectory_id = self.trajectory_id
+        columns = self.x, self.y, self.heading_x, self.heading_y
+
+        for i, trajectory in enumerate(self.trajectories):
+            mask = trajectory_id == i
+            if mask.any():
+                for column, values in zip(columns, trajectory.poses(position[mask])):
+                    column[mask] = values
+
+
+    def centers(self, position, rows=None):
+        """To get where the centers of the balls in rows would be at position
+
+        position holds a length along its trajectory for each of the
+        rows, all of them by default. Past the end of it x and y are NaN"""
+
+        trajectory_id = self.trajectory_id if rows is None else self.trajectory_id[rows]
+        x = numpy.full(len(trajectory_id), numpy.nan)
+        y = numpy.full(len(trajectory_id), numpy.nan)
+
+        for i, trajectory in enumerate(self.trajectories):
+            mask = trajectory_id == i
+            if mask.any():
+                x[mask], y[mask] = trajectory.points(position[mask])
+
+        return x, y
+
+
+    def headings(self):
+        """To get the unit tangent vectors of all balls, NaN once they exited
+
+        They are kept along with the centers, see update_centers"""
+
+        return self.heading_x, self.heading_y
+
+
+    def visibility_cones(self):
+        """To get the visibility cones of all balls as arrays
+
+        They are center x, center y, heading x, heading y, aperture and
+        reach, as taken by inside_cones and visibility_matrix"""
+
+        heading_x, heading_y = self.headings()
+
+        return (self.x, self.y, heading_x, heading_y,
+                numpy.full(self.size, VISIBILITY_APERTURE),
+                VISIBILITY_RADII * self.radius)
+
+
+    def move(self, tick):
+        """To advance every ball by tick seconds"""
+
+        self.position[:] += self.speed * tick
+        self.update_centers()
+        self.pairs.end_tick()
 
 
 class Ball(object):
+    """A vehicle moving along a trajectory
 
+    Its state lives in a row of a BallState, shared with other
+    balls if one is given or private to the ball otherwise"""
 
-    def __init__(self, radius, trajectory, color=RED, draw_cone=False):
-        self.position = 0
-        self.trajectory = trajectory
-        self.center = trajectory.point(self.position)
-        self.radius = radius
+
+    __slots__ = ('serial', 'state', 'index', 'color', 'draw_cone', 'tag')
+
+    __serials = itertools.count()
+
+
+    def __init__(self, radius, trajectory, color=RED, draw_cone=False, state=None):
+        if state is None:
+            state = BallState(1)
+
+        self.serial = next(Ball.__serials)
+        self.state = state
+        self.index = state.add(self, radius, trajectory)
         self.color = color
-        self.speed = 0
-        self.base_speed = None
         self.draw_cone = draw_cone
+        self.tag = None
+
+
+    @property
+    def position(self):
+        return self.state.position[self.index]
+
+
+    @position.setter
+    def position(self, value):
+        self.state.position[self.index] = value
+
+
+    @property
+    def speed(self):
+        return self.state.speed[self.index]
+
+
+    @speed.setter
+    def speed(self, value):
+        self.state.speed[self.index] = value
+
+
+    @property
+    def base_speed(self):
+        base_speed = self.state.base_speed[self.index]
+
+        return None if math.isnan(base_speed) else base_speed
+
+
+    @base_speed.setter
+    def base_speed(self, value):
+        self.state.base_speed[self.index] = numpy.nan if value is None else value
+
+
+    @property
+    def radius(self):
+        return self.state.radius[self.index]
+
 
-        self.distances_to = {} # distances to other balls
+    @property
+    def trajectory(self):
+        return self.state.trajectory(self.index)
+
+
+    @property
+    def center(self):
+        x = self.state.x[self.index]
+
+        if math.isnan(x):
+            return None
+
+        return Point(x, self.state.y[self.index])
+
+
+    @property
+    def center_xy(self):
+        """The center as a tuple of coordinates, None once off the trajectory"""
+
+        x = self.state.x[self.index]
+
+        if math.isnan(x):
+            return None
+
+        return x, self.state.y[self.index]
 
 
     def set_speed(self, speed):
@@ -302,37 +1064,27 @@ class Ball(object):
 
     def move(self, tick):
         self.position += self.speed * tick
-        self.center = self.trajectory.point(self.position)
+        self.state.update_center(self.index)
 
 
     def __get_visibility_cone(self):
-        return self.trajectory.get_tangent_cone(self.position, 0.1, self.radius*18)
+        return self.trajectory.get_tangent_cone(self.position, VISIBILITY_APERTURE,
+                                                self.radius*VISIBILITY_RADII)
 
 
     def render(self, world, screen):
-        if self.center is not None:
-            point_a = Point(self.center.x-self.radius, self.center.y-self.radius)
-
-            width = 2*self.radius
-            height = 2*self.radius
-            size = Point(width, height)
-
-            pygame.draw.ellipse(screen, self.color, [*point2pixel(point_a, world, screen),
-                                                     *point2pixel(size, world, screen)])
-
-            if self.draw_cone:
-                cone = self.__get_visibility_cone()
-
-                if cone is not None:
-                    cone.render(world, screen)
+        cone = self.__get_visibility_cone() if self.draw_cone else None
+        return backend().render_ball(self, cone, world, screen)
 
 
     def can_see(self, ball):
         """To check if input ball is within field of view"""
 
         cone = self.__get_visibility_cone()
-        if cone is not None:
-            return cone.is_inside_cone(ball.center)
+        center = ball.center_xy
+
+        if cone is not None and center is not None:
+            return cone.is_inside_xy(*center)
         else:
             return False
 
@@ -340,21 +1092,19 @@ class Ball(object):
     def distance_to(self, ball):
         """To calculate distance to a ball"""
 
-        return distance(self.center, ball.center)
-
+        x_a, y_a = self.state.x[self.index], self.state.y[self.index]
+        x_b, y_b = ball.state.x[ball.index], ball.state.y[ball.index]
 
-    def relative_speed_to(self, ball, tick):
+        return math.sqrt((x_b - x_a)**2 + (y_b - y_a)**2)
 
-        speed=None
 
-        current_distance = self.distance_to(ball)
+    def relative_speed_to(self, ball, tick):
+        """To get how fast the distance to ball changes, None the first time
 
-        if ball in self.distances_to:
-            last_distance = self.distances_to[ball]
-            speed = (current_distance - last_distance)/tick
+        Distances are kept by the pair tracker of the state of this ball"""
 
-        self.distances_to[ball] = current_distance
-        return speed
+        return self.state.pairs.relative_speed((self.serial, ball.serial),
+                                               self.distance_to(ball), tick)
 
 
     def intersects(self, ball):
@@ -1,60 +1,125 @@
 #!/usr/bin/python3
 from tkinter import *
-import threading
-import queue
+import time
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy
 
-import multiple 
+import multiple
 
 
-def __simulation_thread__(__queue):
+# What the simulation process tells the window, one float each
+STATUS = ('running', 'speed_up', 'seconds', 'balls', 'fps', 'collisions')
+
+
+def __simulation_process__(connection, status_name):
+    """To run simulations as told by the commands coming through connection
+
+    While no simulation runs it waits for a command without spinning. While
+    one runs, it checks for commands after every frame. How it goes is
+    written into the shared memory named status_name, laid out as STATUS."""
+
+    memory = shared_memory.SharedMemory(name=status_name)
+    status = numpy.ndarray(len(STATUS), dtype=float, buffer=memory.buf)
 
     sim = None
-    timeout = 200
+    speed_up = 1
+    last = None
+
+    def stop():
+        import pygame
+
+        sim.close()
+        pygame.display.quit()
+        status[STATUS.index('running')] = 0
+
+    try:
+        while True:
+
+            # Block only while idle
+            if sim is None or connection.poll():
+                msg = connection.recv()
+            else:
+                msg = None
+
+            if msg:
+                print(msg)
+                if msg['cmd'] == 'quit':
+                    print('quit!')
+                    return
+
+                elif msg['cmd'] == 'speed_up':
+                    speed_up = msg['speed_up']
+
+                    # The tick goes with the speed up, so start over
+                    if sim is not None:
+                        stop()
+                        sim = multiple.simulation(True, None, speed_up)
+
+                elif msg['cmd'] == 'start':
+                    print('start simulation!')
+                    speed_up = msg.get('speed_up', speed_up)
+                    if sim is not None:
+                        stop()
+                    sim = multiple.simulation(True, None, speed_up)
+                    last = None
 
-    while True:
+                elif msg['cmd'] == 'stop':
+                    print('stop simulation!')
+                    if sim is not None:
+                        stop()
+                    sim = None
 
-        try:
-            msg = __queue.get(False, timeout)
+            if sim:
+                model = next(sim, None)
 
-        except queue.Empty:
-            msg = None
+                # The window was closed
+                if model is None:
+                    stop()
+                    sim = None
+                    continue
 
-        if msg:
-            print(msg)
-            if msg['cmd'] == 'quit':
-                print('quit!')
-                return
+                now = time.perf_counter()
+                fps = 1 / (now - last) if last is not None and now > last else 0
+                last = now
 
-            elif msg['cmd'] == 'start':
-                print('start simulation!')
-                sim = multiple.simulation(True, None, msg['speed_up'].get())
-                timeout = 0
+                status[:] = (1, speed_up, model.time * speed_up, len(model.balls), fps,
+                             sum(model.collisions.values()))
 
-            elif msg['cmd'] == 'stop': 
-                print('stop simulation!')
-                sim = None
-                timeout = 200
+    finally:
+        if sim is not None:
+            stop()
 
-        if sim:
-            next(sim)
+        del status
+        memory.close()
 
 
 class Gui(object):
 
-    
+
     def __init__(self, master):
 
         self.__master = master
         frame = Frame(master)
         frame.pack()
 
-        self.__queue = queue.Queue(maxsize=1)
+        self.__status_memory = shared_memory.SharedMemory(create=True, size=8 * len(STATUS))
+        self.__status = numpy.ndarray(len(STATUS), dtype=float, buffer=self.__status_memory.buf)
+        self.__status[:] = 0
+
+        # The simulation runs in a process of its own, so the window stays responsive
+        context = multiprocessing.get_context('spawn')
+        self.__connection, child = context.Pipe()
+        self.__process = context.Process(target=__simulation_process__,
+                                         args=(child, self.__status_memory.name))
+        self.__process.start()
 
         label = Label(frame, text="Velocidad:")
         label.grid(row=0, column=1)
 
         self.__speed_up = IntVar(master)
         self.__speed_up.set(1)
+        self.__speed_up.trace_add('write', self.__change_speed_up)
 
         speed_menu = OptionMenu(frame, self.__speed_up, 1, 2, 3, 4, 5, 6)
         speed_menu.grid(row=0, column=2)
@@ -74,20 +139,50 @@ class Gui(object):
                         command=self.__quit)
         button.grid(row=1, column=2)
 
-        threading.Thread(target=__simulation_thread__, args=(self.__queue,)).start()
+        self.__label = Label(frame, text="")
+        self.__label.grid(row=2, column=0, columnspan=3)
+
+        master.protocol("WM_DELETE_WINDOW", self.__quit)
+        self.__poll()
+
+
+    def __poll(self):
+        status = dict(zip(STATUS, self.__status.tolist()))
+
+        if status['running']:
+            self.__label.config(text='{:.0f} s, {:.0f} vehículos, {:.0f} colisiones, {:.0f} fps'.format(
+                status['seconds'], status['balls'], status['collisions'], status['fps']))
+        else:
+            self.__label.config(text='Simulación parada')
+
+        self.__polling = self.__master.after(250, self.__poll)
 
 
     def __start(self):
-        self.__queue.put({'cmd': 'start', 'speed_up': self.__speed_up})
+        self.__connection.send({'cmd': 'start', 'speed_up': self.__speed_up.get()})
 
 
     def __stop(self):
-        self.__queue.put({'cmd': 'stop'})
+        self.__connection.send({'cmd': 'stop'})
+
+
+    def __change_speed_up(self, *args):
+        self.__connection.send({'cmd': 'speed_up', 'speed_up': self.__speed_up.get()})
 
 
     def __quit(self):
-        self.__queue.put({'cmd': 'quit'})
-        self.__master.destroy() 
+        self.__master.after_cancel(self.__polling)
+
+        self.__connection.send({'cmd': 'quit'})
+        self.__process.join(5)
+        if self.__process.is_alive():
+            self.__process.terminate()
+
+        del self.__status
+        self.__status_memory.close()
+        self.__status_memory.unlink()
+
+        self.__master.destroy()
 
 
 if __name__ == '__main__':
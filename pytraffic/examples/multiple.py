@@ -1,6 +1,9 @@
 #!/usr/bin/python3
 """\
-Usage: multiple.py [--with-bike-lane] [--save=dir]
+Usage: multiple.py [--with-bike-lane] [--save=dir] [--speed-up=N] [--instrument=FILE] [--conflict-buffer=M] [--scenario=FILE]
+       multiple.py --headless (--ticks=N | --seconds=T) [--with-bike-lane] [--speed-up=N] [--seed=S] [--instrument=FILE] [--macro-ticks=K] [--safety=F] [--conflict-buffer=M] [--checkpoint=FILE] [--scenario=FILE] [--telemetry=DIR]
+       multiple.py --resume=FILE (--ticks=N | --seconds=T) [--instrument=FILE] [--checkpoint=FILE] [--telemetry=DIR] [--scenario=FILE]
+       multiple.py --replications=R (--ticks=N | --seconds=T) [--processes=P] [--with-bike-lane] [--speed-up=N] [--seed=S] [--macro-ticks=K] [--safety=F] [--conflict-buffer=M] [--scenario=FILE]
 
 To run an example of a simple simulation using pytraffic.
 In this example there are multiple balls, they keep coming
@@ -9,32 +12,66 @@ out at a regular pace with a constant speed.
 Options:
 --with-bike-lane   Do simulation with bike lane
 --save=dir         Directory into which save a movie of the simulation
+--speed-up=N       How faster than real time to run, 1 to 6 [default: 1]
+--headless         Run as fast as possible without drawing anything
+--ticks=N          Number of ticks to run headless
+--seconds=T        Simulated seconds to run headless
+--seed=S           Seed of the random numbers
+--replications=R   Number of independent headless runs to estimate collision rates
+--processes=P      Processes running replications, by default one per core
+--instrument=FILE  Time each phase of the simulation and dump the results to FILE
+--macro-ticks=K    Ticks vehicles out of reach of others advance at once [default: 1]
+--safety=F         How much farther than needed vehicles must be to be out of reach [default: 1.5]
+--conflict-buffer=M  Vehicles only look out for other lanes where they come within M meters
+--checkpoint=FILE  Save the simulation to FILE when the headless run ends
+--resume=FILE      Go on headless from a simulation saved with --checkpoint
+--scenario=FILE    The crossing to simulate, as described in pytraffic.scenario, multiple.json by default,
+                   or where the one of the simulation resumed is now
+--telemetry=DIR    Trace every vehicle every tick and what happens to it into DIR, see pytraffic.telemetry.
+                   With --macro-ticks, vehicles out of reach are only traced at the end of each step
 """
 
-from math import pi
+import os
 from docopt import docopt
 from collections import defaultdict
-import pygame
-from numpy.random import normal
-
-from pytraffic.entities import World
-from pytraffic.entities import Trajectory
-from pytraffic.entities import Line
-from pytraffic.entities import Arc
-from pytraffic.entities import Point
+from functools import partial
+from fractions import Fraction
+import numpy
+
 from pytraffic.entities import Ball
+from pytraffic.entities import BallState
+from pytraffic.entities import VISIBILITY_RADII
+from pytraffic.entities import visible_pairs
+from pytraffic.spatial import SpatialGrid
+from pytraffic.leaders import LeaderIndex
+from pytraffic.runner import Runner
+from pytraffic.montecarlo import seeds, replicate, ReplicationStatistics
+from pytraffic.scheduler import SpawnScheduler
+from pytraffic.instrument import Instruments, NULL
+from pytraffic.contact import contacts, reach
+from pytraffic import checkpoint
+from pytraffic import scenario
+from pytraffic.telemetry import Telemetry
 
-from pytraffic.colors import RED, GREEN, WHITE, BLUE, BLACK
+from pytraffic.colors import WHITE, BLACK
 
 
-pygame.init()
+# pygame is only imported to draw, so the model itself runs headless
 
 SCREEN_SIZE = (799, 535) # In pixels
-SPEED_UP = 1
+
+# The crossing simulated unless told otherwise
+SCENARIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'multiple.json')
 MAX_DECELERATION = -0.9 * 9.81
 
-FONT = pygame.font.SysFont("monospace", 16)
-LINE_HEIGHT = FONT.size("hola")[1]
+# How far ahead, in radii, balls see
+SIGHT = VISIBILITY_RADII
+
+# Farther than this, in radii, balls can neither see nor touch each other
+REACH = SIGHT + 1
+
+FONT = None
+LINE_HEIGHT = None
 
 
 def tick_period(speed_up):
@@ -42,6 +79,12 @@ def tick_period(speed_up):
     return ({ 1: 20, 2: 40, 3: 80, 4: 100, 5: 120, 6: 160 }[speed_up])/(1000*speed_up)
 
 
+def exact_tick_period(speed_up):
+    """As tick_period, as an exact fraction to keep time with"""
+
+    return Fraction({ 1: 20, 2: 40, 3: 80, 4: 100, 5: 120, 6: 160 }[speed_up], 1000*speed_up)
+
+
 def acceleration(distance, rel_speed, speed_up):
 
     acc = 0.8*(9.81/distance)*(rel_speed/speed_up)
@@ -51,33 +94,119 @@ def acceleration(distance, rel_speed, speed_up):
         return min(-MAX_DECELERATION, acc) * speed_up * speed_up
 
 
-def adjust_speeds(balls, speed_up):
-    """To adjust speed of all balls"""
+def speed_gain(speed_up):
+    """To get how much an unimpeded ball speeds up in a tick"""
 
-    for ball in balls:
+    return 0.2 * 9.81 * speed_up * speed_up * tick_period(speed_up)
 
-        unimpeded = True
 
-        for other_ball in balls:
+def get_nearby_balls(ball, balls, grid):
+    """To get the balls that ball may see or touch
+
+    The grid, if any, indexes balls by their position in the list"""
+
+    if grid is None:
+        return balls
+
+    center = ball.center_xy
+    if center is None:
+        return []
+
+    return [balls[_] for _ in grid.neighbours(*center, REACH * ball.radius)]
+
+
+def slow_down(ball, distance_to_other, speed_to_other, speed_up):
+    """To brake when closing on another ball"""
+
+    acc = acceleration(distance_to_other, speed_to_other, speed_up)
+    new_speed = acc * tick_period(speed_up) + ball.speed
+    ball.set_speed(max(0, new_speed))
+
+
+def get_visible_balls(balls, state, grid, leaders, instruments=NULL, conflicts=None):
+    """To map the index of every ball to the balls it sees, in list order
+
+    Balls are the rows of state and all cones are tested in one batch.
+    Given a leader index only balls in other trajectories are tested, and
+    given a ConflictMap as well, only those sharing a conflict zone."""
+
+    if not len(balls):
+        return {}
+
+    i, j = grid.pairs(REACH * numpy.max(state.radius))
+    i, j = numpy.concatenate((i, j)), numpy.concatenate((j, i))
+
+    if leaders is not None:
+        other = state.trajectory_id[i] != state.trajectory_id[j]
+        i, j = i[other], j[other]
+
+        if conflicts is not None:
+            shared = conflicts.shared(state, i, j)
+            i, j = i[shared], j[shared]
+
+    instruments.count('cones', len(balls))
+    instruments.count('cone tests', len(i))
+
+    i, j = visible_pairs(*state.visibility_cones(), state.x, state.y, i, j)
+    order = numpy.lexsort((j, i))
+
+    visible = defaultdict(list)
+    for a, b in zip(i[order].tolist(), j[order].tolist()):
+        visible[a].append(balls[b])
+
+    return visible
 
-            if ball is other_ball:
-                continue
 
-            if ball.can_see(other_ball):
+def adjust_speeds(balls, speed_up, grid=None, leaders=None, state=None, instruments=NULL,
+                  conflicts=None):
+    """To adjust speed of all balls
+
+    Given a leader index balls follow the one ahead in their trajectory,
+    and only balls in other trajectories are checked for sight. Given the
+    state of the balls as well as a grid, cones are checked all at once,
+    and given a ConflictMap only for balls sharing a conflict zone."""
+
+    if state is not None and grid is not None:
+        visible = get_visible_balls(balls, state, grid, leaders, instruments, conflicts)
+    else:
+        visible = None
+
+    for i, ball in enumerate(balls):
+
+        unimpeded = True
+
+        if leaders is not None:
+            leader, gap = leaders.leader(ball)
+            if leader is not None and gap <= SIGHT * ball.radius:
                 unimpeded = False
-                speed_to_other = ball.relative_speed_to(other_ball, tick_period(speed_up))
-                if speed_to_other is not None:
-                    if speed_to_other < 0:
-                        # we are closing! slow down
-                        distance_to_other = ball.distance_to(other_ball)
-                        acc = acceleration(distance_to_other, speed_to_other, speed_up)
-                        new_speed = acc * tick_period(speed_up) + ball.speed
-                        ball.set_speed(max(0, new_speed))
+                speed_to_other = leader.speed - ball.speed
+                if speed_to_other < 0:
+                    # we are closing! slow down
+                    slow_down(ball, gap, speed_to_other, speed_up)
+
+        if visible is None:
+            nearby = [_ for _ in get_nearby_balls(ball, balls, grid)
+                      if _ is not ball
+                      and (leaders is None or _.trajectory is not ball.trajectory)]
+
+            # Every can_see builds a cone
+            instruments.count('cones', len(nearby))
+            instruments.count('cone tests', len(nearby))
+
+            others = [_ for _ in nearby if ball.can_see(_)]
+        else:
+            others = visible.get(i, [])
+
+        for other_ball in others:
+            unimpeded = False
+            speed_to_other = ball.relative_speed_to(other_ball, tick_period(speed_up))
+            if speed_to_other is not None:
+                if speed_to_other < 0:
+                    # we are closing! slow down
+                    slow_down(ball, ball.distance_to(other_ball), speed_to_other, speed_up)
 
         if unimpeded:
-            ball.set_speed(min(ball.base_speed,
-                               0.2 * 9.81 * speed_up * speed_up * tick_period(speed_up)
-                               + ball.speed))
+            ball.set_speed(min(ball.base_speed, speed_gain(speed_up) + ball.speed))
 
 
 def get_colliding_ball(ball, balls):
@@ -90,9 +219,9 @@ def get_colliding_ball(ball, balls):
             return other_ball
 
 
-def get_visible_ball(ball, balls):
+def get_visible_ball(ball, balls, grid=None):
 
-    for other_ball in balls:
+    for other_ball in get_nearby_balls(ball, balls, grid):
         if ball is other_ball:
             continue
 
@@ -100,19 +229,63 @@ def get_visible_ball(ball, balls):
             return other_ball
 
 
-collision_statistics = defaultdict(int)
+def get_colliding_balls(balls, grid, touching=None):
+    """To map the index of every colliding ball to the first one it hits
+
+    Given the pairs touching within the tick and when, as found by
+    contacts, the first one hit is the earliest, and balls overlapping
+    at the end of the tick are taken to touch at the end"""
 
-def remove_balls_that_collide(balls):
+    if grid is None:
+        return {i: get_colliding_ball(ball, balls) for i, ball in enumerate(balls)}
+
+    i, j = grid.intersecting_pairs([_.radius for _ in balls])
+
+    if touching is None:
+        first = {}
+        for a, b in zip(i.tolist(), j.tolist()):
+            first[a] = min(first.get(a, b), b)
+            first[b] = min(first.get(b, a), a)
+
+        return {a: balls[b] for a, b in first.items()}
+
+    time = numpy.concatenate((touching[2], numpy.full(len(i), numpy.inf)))
+    i = numpy.concatenate((touching[0], i))
+    j = numpy.concatenate((touching[1], j))
+    order = numpy.lexsort((j, i, time))
+
+    first = {}
+    for a, b in zip(i[order].tolist(), j[order].tolist()):
+        first.setdefault(a, b)
+        first.setdefault(b, a)
+
+    return {a: balls[b] for a, b in first.items()}
+
+
+def remove_balls_that_collide(balls, grid=None, collision_statistics=None, instruments=NULL,
+                              touching=None, collided=None):
+    """To drop colliding balls, counting collisions by type if given a dict
+
+    Given the pairs touching within the tick, as found by contacts, those
+    are dropped as well as the ones overlapping at the end of it. Given a
+    list, each dropped ball is added to it along with the one it hit."""
 
     _ = []
 
-    for ball in balls:
+    colliding_balls = get_colliding_balls(balls, grid, touching)
+    instruments.count('colliding balls', len(colliding_balls))
 
-        colliding_ball = get_colliding_ball(ball, balls)
+    for i, ball in enumerate(balls):
+
+        colliding_ball = colliding_balls.get(i)
 
         if colliding_ball is not None:
-            tags = sorted([ball.tag, colliding_ball.tag])
-            collision_statistics['{}-{}'.format(*tags)] += 0.5
+            if collision_statistics is not None:
+                tags = sorted([ball.tag, colliding_ball.tag])
+                collision_statistics['{}-{}'.format(*tags)] += 0.5
+
+            if collided is not None:
+                collided.append((ball, colliding_ball))
 
         else:
             _.append(ball)
@@ -120,12 +293,24 @@ def remove_balls_that_collide(balls):
     return _
 
 
-def print_statistics(screen, cum_no_cars, cum_no_vhc, cum_no_cyclestrians):
+def load_font():
+    """To load the font once pygame is initialized"""
+
+    global FONT, LINE_HEIGHT
+    import pygame
+
+    FONT = pygame.font.SysFont("monospace", 16)
+    LINE_HEIGHT = FONT.size("hola")[1]
+
+
+def print_statistics(screen, collision_statistics, totals):
+    """To draw the collisions by type and totals, the vehicles let in by label"""
+    import pygame
 
     __x = SCREEN_SIZE[0]*.10
     __y = SCREEN_SIZE[1]*.6
 
-    pygame.draw.rect(screen, WHITE, [__x, __y, 600, 200])  # TODO: Use line dimensions
+    box = pygame.draw.rect(screen, WHITE, [__x, __y, 600, 200])  # TODO: Use line dimensions
 
     label_position = [__x, __y]
 
@@ -142,46 +327,92 @@ def print_statistics(screen, cum_no_cars, cum_no_vhc, cum_no_cyclestrians):
     label = FONT.render('Totales vehículos:', 1, BLACK)
     screen.blit(label, label_position)
 
-    for key, value in [('Coches', cum_no_cars),
-                       ('Ciclistas vehiculares', cum_no_vhc),
-                       ('Cicleatones', cum_no_cyclestrians)]:
+    for key, value in totals.items():
         label_position[1] += LINE_HEIGHT
         label = FONT.render('{:30}: {}'.format(key.upper(), int(value)), 1, BLACK)
         screen.blit(label, label_position)
 
+    return box
+
 
 class BallShooter(object):
+    """To shoot balls into a trajectory every period seconds
 
+    Speeds are drawn from rng, a numpy Generator, in batches"""
 
-    def __init__(self, speed_up, trajectory, period, mean, spread, color):
-        self.__time = 0
+    BATCH = 256
+
+
+    def __init__(self, speed_up, trajectory, period, mean, spread, color, state=None, rng=None):
+        self.__time = Fraction(0)
+        self.__next = Fraction(0)
+        self.__state = state
+        self.__rng = numpy.random.default_rng() if rng is None else rng
+        self.__speeds = []
+        self.__drawn = 0
         self.__speed_up = speed_up
-        self.__PERIOD = period/speed_up
+        self.__PERIOD = Fraction(period) / speed_up
         self.__trajectory = trajectory
         self.__mean = mean
         self.__spread = spread
         self.__color = color
 
 
-    def __really_spawn(self):
-        ball = Ball(1, self.__trajectory, color=self.__color, draw_cone=True)
-        ball.set_speed(normal(self.__mean, self.__spread)*self.__speed_up)
+    @property
+    def period(self):
+        return self.__PERIOD
+
+
+    def __speed(self):
+        if self.__drawn == len(self.__speeds):
+            self.__speeds = self.__rng.normal(self.__mean, self.__spread, self.BATCH).tolist()
+            self.__drawn = 0
+
+        self.__drawn += 1
+        return self.__speeds[self.__drawn - 1]
+
+
+    def snapshot(self):
+        """To get what changes as it shoots, as a JSON serialisable dict"""
+
+        return {'time': [self.__time.numerator, self.__time.denominator],
+                'next': [self.__next.numerator, self.__next.denominator],
+                'speeds': self.__speeds[self.__drawn:],
+                'rng': self.__rng.bit_generator.state}
+
+
+    def restore(self, snapshot):
+        """To go back to what snapshot() got, random numbers included"""
+
+        self.__time = Fraction(*snapshot['time'])
+        self.__next = Fraction(*snapshot['next'])
+        self.__speeds = list(snapshot['speeds'])
+        self.__drawn = 0
+        self.__rng.bit_generator.state = snapshot['rng']
+
+
+    def shoot(self):
+        """To shoot a ball right now"""
+
+        ball = Ball(1, self.__trajectory, color=self.__color, draw_cone=True,
+                    state=self.__state)
+        ball.set_speed(self.__speed()*self.__speed_up)
 
         return ball
 
 
     def spawn(self, tick):
-        ball=None
+        """To poll the shooter, getting a ball if one is due within tick
 
-        if self.__time == 0:
-            ball = self.__really_spawn()
+        The instants are exact multiples of the period, see SpawnScheduler
+        to wait for many shooters at once"""
 
-        module_a = self.__time % self.__PERIOD
-        self.__time += tick
-        module_b = self.__time % self.__PERIOD
+        ball=None
 
-        if module_b < module_a:
-            ball = self.__really_spawn()
+        self.__time += Fraction(tick)
+        while self.__next <= self.__time:
+            ball = self.shoot()
+            self.__next += self.__PERIOD
 
         return ball
 
@@ -189,120 +420,638 @@ class BallShooter(object):
 def remove_balls_that_exited(balls):
     _ = []
     for ball in balls:
-        if ball.center is not None:
+        if ball.center_xy is not None:
             _.append(ball)
 
     return _
 
 
-def simulation(with_bike_lane, save_dir, speed_up):
+class Simulation(object):
+    """The crossing with its lanes, shooters and vehicles
 
-    fps = speed_up/tick_period(speed_up)
+    It is advanced macro_ticks ticks at a time by step() and needs no
+    pygame unless it is rendered. With more than one tick per step, balls
+    out of reach of any other for the whole step are set aside while
+    the rest advance tick by tick, and then moved all the way at once.
+    How far out of reach is scaled by safety, at least 1. It only pays
+    off where vehicles are far apart, see benchmarks/adaptive_step.py.
+
+    Given a conflict buffer, balls only look out for balls in other lanes
+    where the lanes come within that many meters, or on their way there.
+
+    The crossing is described by the scenario file at scenario_path, by
+    default SCENARIO, see pytraffic.scenario. Once telemetry is set to a
+    Telemetry, every tick is traced into it, see pytraffic.telemetry,
+    but for the balls set aside, only traced at the end of the step.
+    With follow_leaders set to False, balls no longer follow the one ahead
+    through the leader index but look out for it as for any other."""
+
+
+    def __init__(self, with_bike_lane, speed_up, seed=None, instruments=NULL,
+                 macro_ticks=1, safety=1.5, conflict_buffer=None, scenario_path=None):
+        self.with_bike_lane = with_bike_lane
+        self.speed_up = speed_up
+        self.instruments = instruments
+        self.tick = tick_period(speed_up)
+        self.macro_ticks = macro_ticks
+        self.safety = safety
+
+        # The world, lanes and shooters, compiled once and then mapped
+        self.scenario = scenario.load(SCENARIO if scenario_path is None else scenario_path,
+                                      conflict_buffer)
+        lanes = self.scenario.lanes(with_bike_lane)
+        self.lanes = lanes
+
+        # World width and height in meters
+        self.world = self.scenario.world
+        self.trajectories = [self.scenario.trajectories[_] for _ in lanes]
+
+        # The state of all vehicles is kept in arrays to move them at once
+        self.state = BallState()
+
+        # Each shooter draws its own random numbers, seeded from seed
+        if not isinstance(seed, numpy.random.SeedSequence):
+            seed = numpy.random.SeedSequence(seed)
+        rngs = [numpy.random.default_rng(_) for _ in seed.spawn(len(self.scenario.shooters))]
+
+        # Speeds are spread by a fraction of their mean
+        self.shooters = []
+        for shooter, rng in zip(self.scenario.shooters, rngs):
+            if shooter['trajectory'] in lanes:
+                self.shooters.append((BallShooter(speed_up, self.scenario.trajectories[shooter['trajectory']],
+                                                  shooter['period'], shooter['mean'],
+                                                  shooter['mean'] * shooter['deviation'], shooter['color'],
+                                                  self.state, rng),
+                                      shooter['tag']))
+
+        # To know when each shooter is due next
+        self.scheduler = SpawnScheduler()
+        for shooter, tag in self.shooters:
+            self.scheduler.add((shooter, tag), shooter.period)
+
+        # Total number of vehicles let in, by tag
+        self.totals = {_['tag']: 0 for _ in self.scenario.shooters}
+
+        # Number of collisions, by type
+        self.collisions = defaultdict(int)
+
+        # Add some vehicles (balls)
+        self.balls = []
+
+        # To find nearby balls, indexed by their position in balls
+        self.grid = SpatialGrid(self.world, 2 * REACH)
+
+        # To know which ball each one follows in its own trajectory
+        self.leaders = LeaderIndex()
+        self.follow_leaders = True
+
+        # Balls, of radius 1, start looking out as far ahead as they see
+        self.conflict_buffer = conflict_buffer
+        self.conflicts = None
+        if conflict_buffer is not None:
+            self.conflicts = self.scenario.conflict_map(lanes, approach=SIGHT)
+
+        # Where balls come in
+        self.entries = numpy.array([_.point_xy(0) for _ in self.trajectories])
+
+        self.telemetry = None
+
+        self.time = 0
+
+
+    def __spawn(self):
+        spawned = []
+
+        for shooter, tag in self.scheduler.advance(exact_tick_period(self.speed_up)):
+            ball = shooter.shoot()
+
+            if get_visible_ball(ball, self.__nearby(ball)) is None:
+                ball.tag = tag
+                self.balls.append(ball)
+                self.leaders.add(ball)
+                self.totals[tag] += 1
+                spawned.append(ball.serial)
+            else:
+                self.state.remove(ball)
+
+        if self.telemetry is not None:
+            self.telemetry.event('spawn', self.time, spawned)
+
+
+    def __nearby(self, ball):
+        """To get the balls ball may see or touch, going through the state
+
+        Balls come in seldom, so not worth indexing them all in the grid"""
+
+        state = self.state
+        x, y = ball.center_xy
+        close = (state.x - x)**2 + (state.y - y)**2 <= (REACH * ball.radius)**2
+
+        return [state.balls[_] for _ in numpy.flatnonzero(close).tolist()]
+
+
+    def __remove_exited(self):
+        """To drop the balls past the end of their trajectory"""
+
+        if self.telemetry is not None:
+            self.telemetry.event('exit', self.time,
+                                 [_.serial for _ in self.balls if _.center_xy is None])
+
+        self.balls = remove_balls_that_exited(self.balls)
+        self.state.retain(self.balls)
+        self.leaders.retain(self.balls)
 
-    print('desired FPS: {}'.format(fps))
 
-    # World width and height in meters
-    world = World(188, 125.88)
+    def __record(self, state=None):
+        """To trace where every ball of state, by default all of them, is
+        into the telemetry, leaving out those past the end"""
 
-    # Now let us define a trajectory
-    trajectories = [ Trajectory(Line(Point(0, 69.18), Point(98.76, 69.18)),
-                                Arc(Point(98.76, 65.88), 3.5, (3*pi/2, 2*pi)),
-                                Line(Point(101.76, 65.88), Point(101.76, 0))),
-                     Trajectory(Line(Point(0, 69.18), Point(101.76, 69.18)),
-                                Arc(Point(101.76, 65.88), 3.5, (3*pi/2, 2*pi)),
-                                Line(Point(104.76, 65.88), Point(104.76, 0)))]
+        state = self.state if state is None else state
+        lanes = numpy.array([self.trajectories.index(_) for _ in state.trajectories] or [0])
+        rows = numpy.flatnonzero(~numpy.isnan(state.x))
 
-    if with_bike_lane:
-        bike_lane = Trajectory(Line(Point(0, 74.19), Point(94.76, 74.19)),
-                               Arc(Point(94.76, 70.88), 3.5, (3*pi/2, 2*pi)),
-                               Line(Point(97.76, 70.88), Point(97.76, 0)))
+        self.telemetry.states(self.time, state.serial[rows], lanes[state.trajectory_id[rows]],
+                              state.position[rows], state.speed[rows], state.x[rows], state.y[rows])
 
-        trajectories.append(bike_lane)
 
-    # mean=14m/s (50Km/h), std deviation=25%
-    car_shooter = BallShooter(speed_up, trajectories[0], 5, 14, 14*.25, RED)
+    def step(self):
+        """To advance the simulation by macro_ticks ticks"""
 
-    # mean=6.1m/s (21Km/h), std deviation=25%
-    bike_shooter = BallShooter(speed_up, trajectories[1], 13, 6.1, 6.1*.25, GREEN)
+        if self.macro_ticks == 1:
+            self.__tick()
 
-    if with_bike_lane:
-        bike_lane_shooter = BallShooter(speed_up, bike_lane, 20, 6.1, 6.1*.25, BLUE)
+            if self.telemetry is not None:
+                self.__record()
+            return
 
-    # Add some vehicles (balls)
-    balls = []
+        with self.instruments.phase('free'):
+            # Out of the state, ticks only go through the balls that may meet
+            free = self.state.split(self.__free())
+            self.balls = list(self.state.balls)
+            self.leaders.retain(self.balls)
 
-    background = pygame.image.load ("cruce.png")
+        self.instruments.count('balls set aside', free.size)
+
+        # The balls ticking are traced every tick, those set aside once moved
+        for _ in range(self.macro_ticks):
+            self.__tick()
+
+            if self.telemetry is not None:
+                self.__record()
+
+        with self.instruments.phase('free'):
+            self.__advance_free(free)
+
+
+    def __free(self):
+        """To get the rows of the balls out of reach for the next step
+
+        Within macro_ticks ticks no ball goes farther than the highest
+        speed it may reach times that time. Two balls farther apart than
+        they can see, plus both such distances scaled by safety, can
+        neither see, follow nor hit each other. Balls as far from where
+        balls come in are safe too from the ones coming in, as long as
+        those are not faster than safety times the fastest ball now."""
+
+        state = self.state
+        if not state.size:
+            return numpy.empty(0, dtype=int)
+
+        self.grid.rebuild(state.x, state.y)
+
+        horizon = self.macro_ticks * self.tick
+        travel = self.safety * numpy.fmax(state.speed, state.base_speed) * horizon
+        sight = REACH * state.radius
+        farthest = numpy.nanmax(sight) + numpy.nanmax(travel)
+
+        busy = numpy.isnan(state.x)
+
+        i, j = self.grid.pairs(2 * farthest)
+        close = (numpy.hypot(state.x[i] - state.x[j], state.y[i] - state.y[j])
+                 <= numpy.maximum(sight[i], sight[j]) + travel[i] + travel[j])
+        busy[i[close]] = True
+        busy[j[close]] = True
+
+        for x, y in self.entries:
+            busy |= numpy.hypot(state.x - x, state.y - y) <= farthest + travel
+
+        return numpy.flatnonzero(~busy)
+
+
+    def __advance_free(self, free):
+        """To move the balls set aside in free by macro_ticks unimpeded ticks and put them back
+
+        Tick by tick, an unimpeded ball would move at its speed and then
+        speed up by speed_gain up to its base speed. The first m ticks it
+        is below its base speed, so it moves m speeds from speed upwards
+        by the gain, and then the other ticks at its base speed."""
+
+        speed = free.speed
+        base_speed = free.base_speed
+
+        ticks = self.macro_ticks
+        gain = speed_gain(self.speed_up)
+        m = numpy.clip(numpy.ceil((base_speed - speed) / gain), 0, ticks)
+
+        free.position[:] += self.tick * (m * speed + gain * m * (m - 1) / 2
+                                         + (ticks - m) * base_speed)
+        free.speed[:] = numpy.minimum(base_speed, speed + ticks * gain)
+        free.update_centers()
+
+        if self.telemetry is not None:
+            self.__record(free)
+
+        balls = free.balls
+        self.state.merge(free)
+        self.balls = list(self.state.balls)
+
+        for ball in balls:
+            self.leaders.add(ball)
+
+        self.__remove_exited()
+
+
+    def __tick(self):
+        """To advance the simulation by one tick
+
+        Without balls, only spawning is due"""
+
+        instruments = self.instruments
+        self.time += self.tick
+
+        with instruments.phase('spawn'):
+            self.__spawn()
+
+        # Nothing moves nor meets
+        if not self.balls:
+            instruments.count('ticks')
+            return
+
+        with instruments.phase('move'):
+            start = self.state.position.copy()
+            self.state.move(self.tick)
+            self.grid.rebuild(self.state.x, self.state.y)
+            self.leaders.update()
+
+            # Sight, contacts and overlaps all filter the pairs found at the largest reach
+            if self.state.size:
+                self.grid.pairs(max(REACH * numpy.max(self.state.radius), reach(self.state, self.tick)))
+
+        # Before speeds change, to follow balls as they moved
+        with instruments.phase('contacts'):
+            touching = contacts(self.state, start, self.tick, self.grid)
+
+        with instruments.phase('adjust_speeds'):
+            adjust_speeds(self.balls, self.speed_up, self.grid,
+                          self.leaders if self.follow_leaders else None, self.state,
+                          instruments, self.conflicts)
+
+        with instruments.phase('collisions'):
+            collided = [] if self.telemetry is not None else None
+            self.balls = remove_balls_that_collide(self.balls, self.grid, self.collisions,
+                                                   instruments, touching, collided)
+
+            if collided:
+                self.telemetry.event('collision', self.time, [_.serial for _, other in collided],
+                                     [other.serial for _, other in collided])
+
+        with instruments.phase('exits'):
+            self.__remove_exited()
+
+        instruments.count('ticks')
+
+
+    def save(self, path):
+        """To write everything that changes as it runs to a checkpoint at path
+
+        Balls go as arrays, one row each, while shooters, with their random
+        number generators, the scheduler and the counts go in the header.
+        See load to resume from it."""
+
+        state = self.state
+        sources = [_ for _, tag in self.shooters]
+        tags = [tag for _, tag in self.shooters]
+
+        def fraction(value):
+            return [value.numerator, value.denominator]
+
+        header = {'with_bike_lane': self.with_bike_lane,
+                  'speed_up': self.speed_up,
+                  'macro_ticks': self.macro_ticks,
+                  'safety': self.safety,
+                  'conflict_buffer': self.conflict_buffer,
+                  'scenario': os.path.abspath(self.scenario.path),
+                  'scenario_digest': self.scenario.digest,
+                  'time': self.time,
+                  'totals': self.totals,
+                  'collisions': dict(self.collisions),
+                  'tags': tags,
+                  'shooters': [_.snapshot() for _ in sources],
+                  'scheduler': {'time': fraction(self.scheduler.time),
+                                'entries': [[fraction(instant), fraction(period), sources.index(source[0])]
+                                            for instant, period, source in self.scheduler.entries()]}}
+
+        arrays = {name: getattr(state, name) for name in BallState.COLUMNS}
+
+        trajectories = numpy.array([self.trajectories.index(_) for _ in state.trajectories] or [0])
+        arrays['trajectory'] = trajectories[state.trajectory_id]
+        arrays['serial'] = numpy.array([_.serial for _ in state.balls], dtype=numpy.int64)
+        arrays['color'] = numpy.array([_.color for _ in state.balls], dtype=numpy.uint8).reshape(-1, 3)
+        arrays['draw_cone'] = numpy.array([_.draw_cone for _ in state.balls], dtype=bool)
+        arrays['tag'] = numpy.array([tags.index(_.tag) if _.tag in tags else -1
+                                     for _ in state.balls], dtype=numpy.int8)
+
+        # Distances between pairs this tick, 1, and last tick, 0
+        for name, distances in zip(('current', 'last'), state.pairs.distances()):
+            arrays[name + '_pairs'] = numpy.array(list(distances), dtype=numpy.int64).reshape(-1, 2)
+            arrays[name + '_distances'] = numpy.array(list(distances.values()), dtype=float)
+
+        checkpoint.write(path, header, arrays)
+
+
+    @staticmethod
+    def load(path, instruments=NULL, scenario_path=None):
+        """To get a Simulation back from a checkpoint written by save
+
+        It goes on just as the saved one would have. Balls get serial
+        numbers of their own, as the ones saved may be taken. The scenario
+        is read where it was when saved, or from scenario_path if given,
+        and must not have changed since."""
+
+        header, arrays = checkpoint.read(path)
+
+        model = Simulation(header['with_bike_lane'], header['speed_up'], instruments=instruments,
+                           macro_ticks=header['macro_ticks'], safety=header['safety'],
+                           conflict_buffer=header['conflict_buffer'],
+                           scenario_path=header['scenario'] if scenario_path is None else scenario_path)
+
+        if model.scenario.digest != header['scenario_digest']:
+            raise ValueError('{} was saved with another scenario than {}'.format(path, model.scenario.path))
+
+        for (shooter, _), snapshot in zip(model.shooters, header['shooters']):
+            shooter.restore(snapshot)
+
+        model.scheduler = SpawnScheduler()
+        model.scheduler.time = Fraction(*header['scheduler']['time'])
+        for instant, period, index in header['scheduler']['entries']:
+            model.scheduler.add(model.shooters[index], Fraction(*period), Fraction(*instant))
+
+        tags = header['tags']
+        state = model.state
+
+        for trajectory, radius, color, draw_cone, tag in zip(arrays['trajectory'].tolist(),
+                                                            arrays['radius'].tolist(),
+                                                            arrays['color'].tolist(),
+                                                            arrays['draw_cone'].tolist(),
+                                                            arrays['tag'].tolist()):
+            ball = Ball(radius, model.trajectories[trajectory], color=tuple(color),
+                        draw_cone=draw_cone, state=state)
+            ball.tag = tags[tag] if tag >= 0 else None
+            model.balls.append(ball)
+
+        for name in BallState.COLUMNS:
+            getattr(state, name)[:] = arrays[name]
+
+        serials = dict(zip(arrays['serial'].tolist(), [_.serial for _ in model.balls]))
+        distances = []
+        for name in ('current', 'last'):
+            distances.append({(serials[a], serials[b]): distance
+                              for (a, b), distance in zip(arrays[name + '_pairs'].tolist(),
+                                                          arrays[name + '_distances'].tolist())})
+        state.pairs.set_distances(*distances)
+
+        for ball in model.balls:
+            model.leaders.add(ball)
+
+        model.time = header['time']
+        model.totals = header['totals']
+        model.collisions = defaultdict(int, header['collisions'])
+
+        return model
+
+
+    def render(self, screen, background):
+        screen.blit(background, background.get_rect())
+
+        for trajectory in self.trajectories:
+            trajectory.render(self.world, screen)
+
+        self.draw(screen)
+
+
+    def draw(self, screen, batch=None):
+        """To draw what moves and get the rectangles drawn on
+
+        Given a BallBatch all balls are drawn at once with it"""
+
+        with self.instruments.phase('render'):
+            if batch is None:
+                rects = [ball.render(self.world, screen) for ball in self.balls]
+            else:
+                rects = batch.render(self.state, self.world, screen)
+
+        with self.instruments.phase('stats'):
+            labels = self.scenario.labels
+            rects.append(print_statistics(screen, self.collisions,
+                                          {labels.get(tag, tag): total for tag, total in self.totals.items()}))
+
+        return rects
+
+
+def simulation(with_bike_lane, save_dir, speed_up, instruments=NULL, conflict_buffer=None,
+               scenario_path=None):
+    import pygame
+    from pytraffic.rendering import Renderer, BallBatch
+    from pytraffic.capture import FrameCapture
+
+    pygame.init()
+    load_font()
+
+    fps = speed_up/tick_period(speed_up)
+
+    print('desired FPS: {}'.format(fps))
+
+    model = Simulation(with_bike_lane, speed_up, instruments=instruments,
+                       conflict_buffer=conflict_buffer, scenario_path=scenario_path)
+
+    if model.scenario.background is not None:
+        background = pygame.image.load(model.scenario.background)
+    else:
+        background = pygame.Surface(SCREEN_SIZE)
+        background.fill(WHITE)
     screen = pygame.display.set_mode(SCREEN_SIZE)
     pygame.display.set_caption("Simulador de tráfico")
 
-    done = False
+    # Lanes do not move, they are drawn once along with the background
+    renderer = Renderer(screen, model.world, background, model.trajectories)
+    batch = BallBatch()
+
     clock = pygame.time.Clock()
-    _time = 0
-    frame_no = 0
 
-    cum_no_cars = 0
-    cum_no_vhc = 0
-    cum_no_cyclestrians = 0
+    # Frames are encoded and written in the background
+    capture = FrameCapture(save_dir) if save_dir else None
+
+    try:
+        yield from loop(model, screen, renderer, batch, capture, clock, fps, speed_up)
+
+    finally:
+        if capture is not None:
+            capture.close()
+            print('\n{}'.format(capture))
+
 
+def loop(model, screen, renderer, batch, capture, clock, fps, speed_up):
+    """To run the simulation drawing each tick until the window is closed
+
+    The model is yielded after each tick is drawn"""
+    import pygame
+
+    done = False
 
     while not done:
         clock.tick(fps)
-        _time += tick_period(speed_up)
 
-        screen.blit(background, background.get_rect())
+        model.step()
+
+        with model.instruments.phase('restore'):
+            renderer.restore()
+
+        rects = model.draw(screen, batch)
 
-        for trajectory in trajectories:
-            trajectory.render(world, screen)
+        print('fps: %d, number of balls: %d, elapsed time: %.4f seconds\r' % (clock.get_fps(), len(model.balls), model.time * speed_up), end='')
 
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                done = True
 
-        car = car_shooter.spawn(tick_period(speed_up))
-        if car is not None and get_visible_ball(car, balls) is None:
-            car.tag = 'coche'
-            balls.append(car)
-            cum_no_cars += 1
+        with model.instruments.phase('present'):
+            renderer.present(rects)
 
+        if capture is not None:
+            with model.instruments.phase('capture'):
+                capture.capture(screen)
 
-        bike = bike_shooter.spawn(tick_period(speed_up))
-        if bike is not None and get_visible_ball(bike, balls) is None:
-            bike.tag = 'ciclista vehicular'
-            balls.append(bike)
-            cum_no_vhc += 1
+        yield model
 
 
-        if with_bike_lane:
-            bike = bike_lane_shooter.spawn(tick_period(speed_up))
-            if bike is not None and get_visible_ball(bike, balls) is None:
-                bike.tag = 'cicleatón'
-                balls.append(bike)
-                cum_no_cyclestrians += 1
+def run(model, ticks=None, seconds=None):
+    """To run model headless for at least ticks, or seconds, and get a RunReport
 
-        for ball in balls:
-            ball.move(tick_period(speed_up))
-            ball.render(world, screen)
+    Its ticks are steps of model.macro_ticks ticks"""
 
-        adjust_speeds(balls, speed_up)
-        balls = remove_balls_that_exited(balls)
-        balls = remove_balls_that_collide(balls)
+    runner = Runner(model, model.tick * model.macro_ticks, model.speed_up)
 
-        print('fps: %d, number of balls: %d, elapsed time: %.4f seconds\r' % (clock.get_fps(), len(balls), _time * speed_up), end='')
+    if ticks is not None:
+        ticks = -(-ticks // model.macro_ticks)
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                done = True
+    return runner.run(ticks=ticks, seconds=seconds)
+
+
+def headless(with_bike_lane, speed_up, ticks=None, seconds=None, seed=None, instruments=NULL,
+             macro_ticks=1, safety=1.5, conflict_buffer=None, checkpoint=None, resume=None,
+             scenario_path=None, telemetry=None):
+    """To run the simulation as fast as possible and report how it went
+
+    Given resume, the simulation saved there goes on instead of a new one
+    and given checkpoint, it is saved there at the end. Given telemetry,
+    a directory, the run is traced into it."""
+
+    if resume is not None:
+        model = Simulation.load(resume, instruments, scenario_path)
+    else:
+        model = Simulation(with_bike_lane, speed_up, seed, instruments, macro_ticks, safety,
+                           conflict_buffer, scenario_path)
+
+    tracer = None
+    if telemetry is not None:
+        tracer = Telemetry(telemetry, header={'trajectories': model.lanes,
+                                              'speed_up': model.speed_up,
+                                              'tick': model.tick})
+        model.telemetry = tracer
+
+    try:
+        report = run(model, ticks, seconds)
+    finally:
+        if tracer is not None:
+            tracer.close()
 
-        print_statistics(screen, cum_no_cars, cum_no_vhc, cum_no_cyclestrians)
-        pygame.display.flip()
+    print(report)
+    if model.macro_ticks > 1:
+        print('steps of {} ticks'.format(model.macro_ticks))
+    print('vehicles: {}'.format(model.totals))
+    print('collisions: {}'.format(dict(model.collisions)))
 
-        if save_dir:
-            frame_no += 1
-            pygame.image.save(screen, '{}/image{}.jpeg'.format(save_dir, frame_no))
+    if tracer is not None:
+        print(tracer)
 
-        yield True
+    if checkpoint is not None:
+        model.save(checkpoint)
+
+    return report
+
+
+def replication(seed, with_bike_lane, speed_up, ticks=None, seconds=None, macro_ticks=1,
+                safety=1.5, conflict_buffer=None, scenario_path=None):
+    """To run one headless replication and get its collisions by type"""
+
+    model = Simulation(with_bike_lane, speed_up, seed, macro_ticks=macro_ticks, safety=safety,
+                       conflict_buffer=conflict_buffer, scenario_path=scenario_path)
+    run(model, ticks, seconds)
+
+    return dict(model.collisions)
+
+
+def replications(count, with_bike_lane, speed_up, ticks=None, seconds=None,
+                 seed=None, processes=None, macro_ticks=1, safety=1.5, conflict_buffer=None,
+                 scenario_path=None):
+    """To estimate collisions per run out of independent runs in parallel"""
+
+    one = partial(replication, with_bike_lane=with_bike_lane, speed_up=speed_up,
+                  ticks=ticks, seconds=seconds, macro_ticks=macro_ticks, safety=safety,
+                  conflict_buffer=conflict_buffer, scenario_path=scenario_path)
+    statistics = ReplicationStatistics()
+
+    for collisions in replicate(one, seeds(seed, count), processes):
+        statistics.add(collisions)
+
+        print('run {}/{}: {}'.format(statistics.runs, count,
+                                     ', '.join('{} {}'.format(key, estimate)
+                                               for key, estimate in statistics.estimates().items())))
+
+    return statistics
 
 
 if __name__ == '__main__':
     ARGS = docopt(__doc__)
 
-    for _ in simulation(ARGS['--with-bike-lane'], ARGS['--save'], SPEED_UP):
-        if not _:
-            break
+    TICKS = int(ARGS['--ticks']) if ARGS['--ticks'] else None
+    SECONDS = float(ARGS['--seconds']) if ARGS['--seconds'] else None
+    SEED = int(ARGS['--seed']) if ARGS['--seed'] else None
+    INSTRUMENTS = Instruments() if ARGS['--instrument'] else NULL
+    MACRO_TICKS = int(ARGS['--macro-ticks'])
+    SAFETY = float(ARGS['--safety'])
+    BUFFER = float(ARGS['--conflict-buffer']) if ARGS['--conflict-buffer'] else None
+
+    if ARGS['--headless'] or ARGS['--resume']:
+        headless(ARGS['--with-bike-lane'], int(ARGS['--speed-up']),
+                 ticks=TICKS, seconds=SECONDS, seed=SEED, instruments=INSTRUMENTS,
+                 macro_ticks=MACRO_TICKS, safety=SAFETY, conflict_buffer=BUFFER,
+                 checkpoint=ARGS['--checkpoint'], resume=ARGS['--resume'],
+                 scenario_path=ARGS['--scenario'], telemetry=ARGS['--telemetry'])
+
+    elif ARGS['--replications']:
+        replications(int(ARGS['--replications']), ARGS['--with-bike-lane'],
+                     int(ARGS['--speed-up']), ticks=TICKS, seconds=SECONDS, seed=SEED,
+                     processes=int(ARGS['--processes']) if ARGS['--processes'] else None,
+                     macro_ticks=MACRO_TICKS, safety=SAFETY, conflict_buffer=BUFFER,
+                     scenario_path=ARGS['--scenario'])
+
+    else:
+        for _ in simulation(ARGS['--with-bike-lane'], ARGS['--save'], int(ARGS['--speed-up']),
+                            INSTRUMENTS, BUFFER, ARGS['--scenario']):
+            if not _:
+                break
+
+    if INSTRUMENTS.enabled:
+        print('\n{}'.format(INSTRUMENTS))
+        INSTRUMENTS.dump(ARGS['--instrument'])
@@ -15,6 +15,7 @@ from pytraffic.entities import Line
 from pytraffic.entities import Arc
 from pytraffic.entities import Point
 from pytraffic.entities import Ball
+from pytraffic.entities import end_tick
 
 from pytraffic.colors import RED, GREEN, WHITE
 
@@ -97,6 +98,7 @@ def simulation():
         screen.blit(background, background.get_rect())
         red_ball.move(TICK_PERIOD/1000)
         green_ball.move(TICK_PERIOD/1000)
+        end_tick([red_ball, green_ball])
 
         for trajectory in trajectories:
             trajectory.render(world, screen)
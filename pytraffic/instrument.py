@@ -0,0 +1,176 @@
+"""To time the phases of a simulation and count what it does"""
+
+import json
+import time
+from collections import deque
+import numpy
+
+
+class Phase(object):
+    """To time a block of code into a rolling window of Instruments"""
+
+    __slots__ = ('samples', 'start')
+
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.start = None
+
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.samples.append(time.perf_counter() - self.start)
+
+
+class NullPhase(object):
+    """A Phase that times nothing"""
+
+    __slots__ = ()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class Instruments(object):
+    """Per phase timers and counters
+
+    Each phase keeps the durations of its last window runs, from which
+    statistics and histograms are worked out when asked for. Counters are
+    running totals.
+
+        with instruments.phase('move'):
+            state.move(tick)
+        instruments.count('pair tests', len(pairs))
+    """
+
+    enabled = True
+
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.__phases = {}
+        self.__counters = {}
+
+
+    def phase(self, name):
+        """To get a context manager timing a run of the phase name"""
+
+        phase = self.__phases.get(name)
+
+        if phase is None:
+            phase = self.__phases[name] = Phase(self.window)
+
+        return phase
+
+
+    def count(self, name, number=1):
+        self.__counters[name] = self.__counters.get(name, 0) + number
+
+
+    def phases(self):
+        return list(self.__phases)
+
+
+    def counter(self, name):
+        return self.__counters.get(name, 0)
+
+
+    def counters(self):
+        return dict(self.__counters)
+
+
+    def samples(self, name):
+        """To get the durations in seconds of the last runs of the phase name"""
+
+        phase = self.__phases.get(name)
+
+        return numpy.array(phase.samples if phase is not None else (), dtype=float)
+
+
+    def histogram(self, name, bins=10):
+        """To get the counts and bin edges of the last durations of the phase name"""
+
+        return numpy.histogram(self.samples(name), bins)
+
+
+    def statistics(self, name):
+        """To get the samples, mean, median, 95th percentile and maximum of the
+        last durations of the phase name, in seconds"""
+
+        samples = self.samples(name)
+
+        if not len(samples):
+            return {'samples': 0}
+
+        median, p95 = numpy.percentile(samples, [50, 95]).tolist()
+
+        return {'samples': len(samples),
+                'mean': float(samples.mean()),
+                'median': median,
+                'p95': p95,
+                'max': float(samples.max())}
+
+
+    def summary(self):
+        return {'phases': {name: self.statistics(name) for name in self.__phases},
+                'counters': self.counters()}
+
+
+    def dump(self, path, bins=10):
+        """To write the summary and histograms of all phases to path as JSON"""
+
+        summary = self.summary()
+        summary['histograms'] = {}
+
+        for name in self.__phases:
+            counts, edges = self.histogram(name, bins)
+            summary['histograms'][name] = {'counts': counts.tolist(), 'edges': edges.tolist()}
+
+        with open(path, 'w') as file:
+            json.dump(summary, file, indent=2)
+
+
+    def __str__(self):
+        lines = ['{:20} {:>7} {:>10} {:>10} {:>10}'.format('phase', 'samples', 'mean ms',
+                                                         'p95 ms', 'max ms')]
+
+        for name in self.__phases:
+            statistics = self.statistics(name)
+            if statistics['samples']:
+                lines.append('{:20} {:7} {:10.3f} {:10.3f} {:10.3f}'.format(
+                    name, statistics['samples'], 1e3 * statistics['mean'],
+                    1e3 * statistics['p95'], 1e3 * statistics['max']))
+
+        for name, value in self.__counters.items():
+            lines.append('{:20} {:>7}'.format(name, value))
+
+        return '\n'.join(lines)
+
+
+class NullInstruments(Instruments):
+    """Instruments that record nothing, to leave them in at no cost"""
+
+    enabled = False
+
+    __phase = NullPhase()
+
+
+    def phase(self, name):
+        return self.__phase
+
+
+    def count(self, name, number=1):
+        pass
+
+
+# To use when no instruments are given
+NULL = NullInstruments()
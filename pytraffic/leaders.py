@@ -0,0 +1,111 @@
+"""Index of which ball each ball follows along its trajectory"""
+
+import bisect
+
+
+class Lane(object):
+    """The balls on one trajectory ordered from rear to front"""
+
+    def __init__(self, trajectory):
+        self.trajectory = trajectory
+        self.balls = []
+        self.positions = []
+
+
+    def find(self, ball):
+        """To get the index of ball in the lane"""
+
+        position = ball.position
+        i = bisect.bisect_left(self.positions, position)
+
+        while i < len(self.balls) and self.positions[i] == position:
+            if self.balls[i] is ball:
+                return i
+            i += 1
+
+        # Ball moved since the lane was last sorted
+        return self.balls.index(ball)
+
+
+class LeaderIndex(object):
+    """Balls of each trajectory ordered by how far along it they are
+
+    The ball a vehicle follows on its own trajectory is the one right
+    ahead of it, so it can be found without testing other balls"""
+
+
+    def __init__(self):
+        self.__lanes = {}
+
+
+    def __lane(self, ball):
+        trajectory = ball.trajectory
+        lane = self.__lanes.get(id(trajectory))
+
+        if lane is None:
+            lane = self.__lanes[id(trajectory)] = Lane(trajectory)
+
+        return lane
+
+
+    def add(self, ball):
+        lane = self.__lane(ball)
+        i = bisect.bisect_right(lane.positions, ball.position)
+
+        lane.balls.insert(i, ball)
+        lane.positions.insert(i, ball.position)
+
+
+    def remove(self, ball):
+        lane = self.__lane(ball)
+        i = lane.find(ball)
+
+        del lane.balls[i]
+        del lane.positions[i]
+
+
+    def retain(self, balls):
+        """To remove every ball that is not in balls"""
+
+        keep = set(id(_) for _ in balls)
+
+        for lane in self.__lanes.values():
+            if all(id(_) in keep for _ in lane.balls):
+                continue
+
+            rows = [i for i, _ in enumerate(lane.balls) if id(_) in keep]
+            lane.balls = [lane.balls[_] for _ in rows]
+            lane.positions = [lane.positions[_] for _ in rows]
+
+
+    def update(self):
+        """To sort the lanes again, to be called after balls move
+
+        Balls seldom overtake each other, so the lanes are almost
+        sorted and sorting them again takes linear time"""
+
+        for lane in self.__lanes.values():
+            positions = [_.position for _ in lane.balls]
+
+            if all(a <= b for a, b in zip(positions, positions[1:])):
+                lane.positions = positions
+                continue
+
+            order = sorted(range(len(positions)), key=positions.__getitem__)
+            lane.balls = [lane.balls[_] for _ in order]
+            lane.positions = [positions[_] for _ in order]
+
+
+    def leader(self, ball):
+        """To get the ball ahead of ball in its trajectory and the gap to it
+
+        The gap is the length along the trajectory between both centers.
+        Balls that went past the end of the trajectory lead no one."""
+
+        lane = self.__lane(ball)
+        i = lane.find(ball) + 1
+
+        if i == len(lane.balls) or lane.positions[i] >= lane.trajectory.distance():
+            return None, None
+
+        return lane.balls[i], lane.positions[i] - lane.positions[i - 1]
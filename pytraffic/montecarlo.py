@@ -0,0 +1,79 @@
+"""To run independent replications of a simulation in parallel"""
+
+import math
+import multiprocessing
+import numpy
+
+
+def seeds(seed, replications):
+    """To get independent seeds for each replication out of one seed"""
+
+    return numpy.random.SeedSequence(seed).spawn(replications)
+
+
+def replicate(run, seeds, processes=None):
+    """To call run(seed) for every seed over a pool of processes
+
+    Results are yielded as soon as each run finishes, in whatever order.
+    run must be picklable, like a module level function or a partial of
+    one, and should return a dict of counts such as collisions by type."""
+
+    with multiprocessing.Pool(processes) as pool:
+        yield from pool.imap_unordered(run, seeds)
+
+
+class Estimate(object):
+    """The mean of a count over runs and its confidence interval"""
+
+    def __init__(self, mean, half_width, runs):
+        self.mean = mean
+        self.half_width = half_width
+        self.runs = runs
+
+
+    def __str__(self):
+        return '{:.3f} ± {:.3f}'.format(self.mean, self.half_width)
+
+
+class ReplicationStatistics(object):
+    """Running statistics of the counts returned by each run
+
+    A count missing from a run counts as zero for that run"""
+
+
+    def __init__(self):
+        self.runs = 0
+        self.__sums = {}
+        self.__squares = {}
+
+
+    def add(self, counts):
+        self.runs += 1
+
+        for key, value in counts.items():
+            self.__sums[key] = self.__sums.get(key, 0) + value
+            self.__squares[key] = self.__squares.get(key, 0) + value * value
+
+
+    def keys(self):
+        return sorted(self.__sums)
+
+
+    def estimate(self, key, z=1.96):
+        """To get the mean of key and the half width of its interval
+
+        The interval is the normal approximation, z=1.96 being 95%"""
+
+        n = self.runs
+        mean = self.__sums.get(key, 0) / n if n else math.nan
+
+        if n < 2:
+            return Estimate(mean, math.inf, n)
+
+        variance = max(0, (self.__squares.get(key, 0) - n * mean * mean) / (n - 1))
+
+        return Estimate(mean, z * math.sqrt(variance / n), n)
+
+
+    def estimates(self, z=1.96):
+        return {key: self.estimate(key, z) for key in self.keys()}
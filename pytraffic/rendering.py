@@ -0,0 +1,194 @@
+"""Rendering of the entities with pygame
+
+This module is only imported the first time something is rendered,
+so simulations that draw nothing run without pygame. Functions return
+the rectangle they drew on, or None if they drew nothing."""
+
+import numpy
+import pygame
+from .colors import BLACK, BLUE
+from .entities import point2pixel, xy2pixel, Point
+
+
+def render_point(point, world, screen):
+    pixel_x, pixel_y = point2pixel(point, world, screen)
+    return pygame.draw.line(screen, BLACK, [pixel_x, pixel_y], [pixel_x, pixel_y], 1)
+
+
+def render_line(line, world, screen):
+    pixel_a_x, pixel_a_y = point2pixel(line.point_a, world, screen)
+    pixel_b_x, pixel_b_y = point2pixel(line.point_b, world, screen)
+
+    return pygame.draw.line(screen, line.color, [pixel_a_x, pixel_a_y], [pixel_b_x, pixel_b_y], 1)
+
+
+def render_arc(arc, world, screen):
+    p_a = Point(arc.center.x - arc.radius, arc.center.y - arc.radius)
+
+    x, y = point2pixel(p_a, world, screen)
+    dx, dy = point2pixel(Point(2 * arc.radius, 2 * arc.radius), world, screen)
+
+    if arc.arc[1] < arc.arc[0]:
+        angles = arc.arc[1], arc.arc[0]
+    else:
+        angles = arc.arc
+
+    return pygame.draw.arc(screen, arc.color, [x, y, dx, dy], *angles, 1)
+
+
+def render_cone(cone, world, screen, color=BLUE):
+    return pygame.draw.polygon(screen,
+                               color,
+                               [xy2pixel(x, y, world, screen) for x, y in cone.outline_xy()],
+                               1)
+
+
+def render_ball(ball, cone, world, screen):
+    """To draw a ball and, if given, its visibility cone"""
+
+    center = ball.center_xy
+
+    if center is not None:
+        x, y = center
+        radius = ball.radius
+
+        rect = pygame.draw.ellipse(screen, ball.color,
+                                   [*xy2pixel(x-radius, y-radius, world, screen),
+                                    *xy2pixel(2*radius, 2*radius, world, screen)])
+
+        if cone is not None:
+            rect = rect.union(render_cone(cone, world, screen))
+
+        return rect
+
+
+class BallBatch(object):
+    """To draw all the balls of a BallState, and their cones, at once
+
+    World coordinates are turned into pixels with one affine transform
+    over the state arrays. Each ball is a stamp of a sprite, drawn once
+    per color and size, and all stamps are blitted in one call."""
+
+
+    def __init__(self):
+        self.__sprites = {}
+
+
+    def __sprite(self, color, width, height):
+        key = color, width, height
+        sprite = self.__sprites.get(key)
+
+        if sprite is None:
+            sprite = pygame.Surface((width, height), pygame.SRCALPHA)
+            pygame.draw.ellipse(sprite, color, [0, 0, width, height])
+            self.__sprites[key] = sprite
+
+        return sprite
+
+
+    def render(self, state, world, screen, cones=True):
+        """To draw the balls in state, and the cones of those having
+        draw_cone set if cones, and get the rectangles drawn on"""
+
+        scale_x = screen.get_width() / world.width
+        scale_y = screen.get_height() / world.height
+
+        inside = numpy.flatnonzero(~numpy.isnan(state.x))
+        if not len(inside):
+            return []
+
+        x = state.x[inside]
+        y = state.y[inside]
+        radius = state.radius[inside]
+
+        left = ((x - radius) * scale_x).astype(int)
+        top = ((y - radius) * scale_y).astype(int)
+        width = (2 * radius * scale_x).astype(int)
+        height = (2 * radius * scale_y).astype(int)
+
+        balls = [state.balls[_] for _ in inside.tolist()]
+
+        rects = screen.blits([(self.__sprite(ball.color, w, h), (l, t))
+                              for ball, l, t, w, h in zip(balls, left.tolist(), top.tolist(),
+                                                          width.tolist(), height.tolist())])
+
+        if cones:
+            rects.extend(self.__render_cones(state, inside, balls, scale_x, scale_y, screen))
+
+        return rects
+
+
+    def __render_cones(self, state, inside, balls, scale_x, scale_y, screen):
+        wanted = numpy.array([ball.draw_cone for ball in balls], dtype=bool)
+        rows = inside[wanted]
+        if not len(rows):
+            return []
+
+        center_x, center_y, heading_x, heading_y, aperture, reach = state.visibility_cones()
+        center_x, center_y = center_x[rows], center_y[rows]
+        far_x = center_x + heading_x[rows] * reach[rows]
+        far_y = center_y + heading_y[rows] * reach[rows]
+        alpha = aperture[rows] / 2
+
+        # As VisibilityCone.outline_xy, rotating the far point by +-alpha
+        corners = [(center_x, center_y),
+                   (far_x - (far_y - center_y) * alpha, far_y + (far_x - center_x) * alpha),
+                   (far_x, far_y),
+                   (far_x + (far_y - center_y) * alpha, far_y - (far_x - center_x) * alpha)]
+
+        outline = numpy.stack([numpy.stack((x * scale_x, y * scale_y), axis=-1)
+                               for x, y in corners], axis=1)
+
+        return [pygame.draw.polygon(screen, BLUE, polygon, 1) for polygon in outline.tolist()]
+
+
+class Renderer(object):
+    """To draw frames on the display redrawing only what changes
+
+    The background and the trajectories are composed once into a cached
+    surface. Each frame the areas drawn on in the previous one are
+    restored from it, and only those and the ones drawn on now are sent
+    to the display, so the cost grows with what moves and not with the
+    size of the screen."""
+
+
+    def __init__(self, screen, world, background, trajectories):
+        self.screen = screen
+        self.world = world
+
+        self.static = pygame.Surface(screen.get_size())
+        self.static.blit(background, background.get_rect())
+        for trajectory in trajectories:
+            trajectory.render(world, self.static)
+
+        if pygame.display.get_surface() is not None:
+            self.static = self.static.convert()
+
+        self.__drawn = []
+        self.__first = True
+
+
+    def restore(self):
+        """To wipe what was drawn in the previous frame"""
+
+        if self.__first:
+            self.screen.blit(self.static, (0, 0))
+            return
+
+        for rect in self.__drawn:
+            self.screen.blit(self.static, rect, rect)
+
+
+    def present(self, rects):
+        """To show the frame, given the rectangles drawn on since restore()"""
+
+        bounds = self.screen.get_rect()
+        rects = [_.clip(bounds) for _ in rects if _ is not None]
+
+        if self.__first:
+            pygame.display.flip()
+            self.__first = False
+        else:
+            pygame.display.update(self.__drawn + rects)
+
+        self.__drawn = rects
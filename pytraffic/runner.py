@@ -0,0 +1,80 @@
+"""To run simulations as fast as possible, with nothing drawn"""
+
+import math
+import time
+
+
+class RunReport(object):
+    """What a run advanced and how long it took"""
+
+    def __init__(self, ticks, simulated_seconds, wall_seconds):
+        self.ticks = ticks
+        self.simulated_seconds = simulated_seconds
+        self.wall_seconds = wall_seconds
+
+
+    @property
+    def speed(self):
+        """Simulated seconds per wall clock second"""
+
+        if self.wall_seconds == 0:
+            return math.inf
+
+        return self.simulated_seconds / self.wall_seconds
+
+
+    def __str__(self):
+        return ('{} ticks, {:.1f} simulated seconds in {:.2f} wall seconds '
+                '({:.1f} simulated seconds per second)'.format(self.ticks,
+                                                               self.simulated_seconds,
+                                                               self.wall_seconds,
+                                                               self.speed))
+
+
+class Runner(object):
+    """To advance a model by fixed ticks without waiting for a clock
+
+    The model only needs a step() method advancing it by one tick of
+    tick seconds. As in the examples, ticks are scaled by speed_up to
+    tell the simulated time, so tick is tick_period(speed_up)."""
+
+
+    def __init__(self, model, tick, speed_up=1):
+        self.model = model
+        self.tick = tick
+        self.speed_up = speed_up
+        self.ticks = 0
+
+
+    @property
+    def simulated_seconds(self):
+        # Multiply instead of adding up ticks, so no error piles up
+        return self.ticks * self.tick * self.speed_up
+
+
+    def ticks_for(self, seconds):
+        """To get how many ticks it takes to simulate seconds"""
+
+        return math.ceil(round(seconds / (self.tick * self.speed_up), 9))
+
+
+    def run(self, ticks=None, seconds=None):
+        """To advance the model by ticks, or by seconds of simulated time"""
+
+        if (ticks is None) == (seconds is None):
+            raise ValueError('Give either ticks or seconds')
+
+        if ticks is None:
+            ticks = self.ticks_for(seconds)
+
+        step = self.model.step
+        start_seconds = self.simulated_seconds
+        start = time.perf_counter()
+
+        for _ in range(ticks):
+            step()
+
+        wall_seconds = time.perf_counter() - start
+        self.ticks += ticks
+
+        return RunReport(ticks, self.simulated_seconds - start_seconds, wall_seconds)
@@ -0,0 +1,232 @@
+"""To describe a scenario in a JSON file and compile it once
+
+A scenario is the world, in meters, a background image, named
+trajectories made of lines and arcs and the shooters letting balls into
+them, see examples/multiple.json:
+
+    {"world": [188, 125.88],
+     "background": "cruce.png",
+     "spacing": 0.25,
+     "trajectories": {"coche": [{"line": [[0, 69.18], [98.76, 69.18]]},
+                                {"arc": [[98.76, 65.88], 3.5, [270, 360]]}, ...]},
+     "bike_lane": ["cicleatón"],
+     "shooters": [{"trajectory": "coche", "tag": "coche", "period": 5,
+                   "mean": 14, "deviation": 0.25, "color": "red", "label": "Coches"}, ...]}
+
+Arcs go around a center with a radius, from one angle to another in
+degrees. Given a spacing, trajectories answer out of lookup tables that
+fine, see Trajectory.tabulate. The trajectories listed in bike_lane, and
+their shooters, are only there with a bike lane. Shooters let balls in
+every period seconds at mean meters per second, deviation being a
+fraction of the mean, colors are named after pytraffic.colors or given
+as RGB and labels, optional, name the totals of their tags on screen.
+Without a background balls are drawn on white.
+
+What takes time to work out, the lookup tables of the trajectories given
+a spacing and the conflict intervals between them, is written once into a
+checkpoint named after a hash of the file, so later loads map it instead."""
+
+import os
+import json
+import math
+import hashlib
+import itertools
+import numpy
+
+from pytraffic.entities import World
+from pytraffic.entities import Trajectory
+from pytraffic.entities import Line
+from pytraffic.entities import Arc
+from pytraffic.entities import Point
+from pytraffic.conflicts import ConflictMap, conflict_intervals
+from pytraffic import checkpoint
+from pytraffic import colors
+
+
+# Goes into the hash, to be bumped whenever what is compiled changes
+VERSION = 1
+
+TABLE = ('offsets', 'steps', 'counts', 'poses')
+
+
+def segment(document):
+    """To get the Line or Arc a segment of a trajectory describes"""
+
+    if 'line' in document:
+        point_a, point_b = document['line']
+        return Line(Point(*point_a), Point(*point_b))
+
+    if 'arc' in document:
+        center, radius, degrees = document['arc']
+        return Arc(Point(*center), radius, tuple(math.radians(_) for _ in degrees))
+
+    raise ValueError('unknown segment {}'.format(document))
+
+
+def color(value):
+    """To get an RGB tuple given one or a name in pytraffic.colors"""
+
+    if isinstance(value, str):
+        return getattr(colors, value.upper())
+
+    return tuple(value)
+
+
+class Scenario(object):
+    """What a scenario file describes, see load to get one
+
+    trajectories is a dict of Trajectory by name, in the order of the
+    file, shooters a list of dicts as in the file, colors as tuples, and
+    labels the label of every tag, the tag itself if it has none. digest
+    is the SHA-256 of the file, in hexadecimal, if given.
+    Given a buffer, intervals holds the conflict intervals within buffer
+    meters of every pair of trajectories, by pair of names."""
+
+
+    def __init__(self, document, path=None, buffer=None, digest=None):
+        self.path = path
+        self.buffer = buffer
+        self.digest = digest
+
+        directory = os.path.dirname(path) if path is not None else ''
+
+        self.world = World(*document['world'])
+        self.background = (os.path.join(directory, document['background'])
+                           if document.get('background') else None)
+        self.spacing = document.get('spacing')
+
+        self.trajectories = {name: Trajectory(*[segment(_) for _ in segments])
+                             for name, segments in document['trajectories'].items()}
+        self.bike_lane = set(document.get('bike_lane', []))
+
+        self.shooters = [dict(_, color=color(_['color'])) for _ in document['shooters']]
+        self.labels = {_['tag']: _.get('label', _['tag']) for _ in self.shooters}
+
+        self.intervals = None
+
+
+    def lanes(self, with_bike_lane):
+        """To get the names of the trajectories there are, with the bike lane or not"""
+
+        return [_ for _ in self.trajectories if with_bike_lane or _ not in self.bike_lane]
+
+
+    def compile(self):
+        """To tabulate the trajectories and find the conflict intervals"""
+
+        for trajectory in self.trajectories.values():
+            trajectory.tabulate(self.spacing)
+
+        if self.buffer is not None:
+            self.intervals = {(a, b): conflict_intervals(self.trajectories[a], self.trajectories[b],
+                                                         self.buffer)
+                              for a, b in itertools.combinations(self.trajectories, 2)}
+
+
+    def arrays(self):
+        """To get what compile worked out as a dict of arrays, see set_arrays"""
+
+        names = list(self.trajectories)
+        arrays = {}
+
+        for index, trajectory in enumerate(self.trajectories.values()):
+            table = trajectory.table()
+            if table is not None:
+                for name, array in zip(TABLE, table):
+                    arrays['{}.{}'.format(index, name)] = array
+
+        if self.intervals is not None:
+            rows = [(names.index(a), names.index(b)) + interval_a + interval_b
+                    for (a, b), found in self.intervals.items()
+                    for interval_a, interval_b in found]
+
+            arrays['intervals'] = numpy.array(rows, dtype=float).reshape(-1, 6)
+
+        return arrays
+
+
+    def set_arrays(self, arrays):
+        """To take what compile works out from arrays, mapped or not"""
+
+        names = list(self.trajectories)
+
+        for index, trajectory in enumerate(self.trajectories.values()):
+            if '{}.offsets'.format(index) in arrays:
+                trajectory.set_table([arrays['{}.{}'.format(index, _)] for _ in TABLE])
+
+        if 'intervals' in arrays:
+            self.intervals = {_: [] for _ in itertools.combinations(names, 2)}
+
+            for a, b, a_0, a_1, b_0, b_1 in arrays['intervals'].tolist():
+                self.intervals[names[int(a)], names[int(b)]].append(((a_0, a_1), (b_0, b_1)))
+
+
+    def conflict_map(self, lanes, approach=0):
+        """To get the ConflictMap of some lanes out of the intervals found"""
+
+        intervals = {(self.trajectories[a], self.trajectories[b]): found
+                     for (a, b), found in self.intervals.items()}
+
+        return ConflictMap([self.trajectories[_] for _ in lanes], self.buffer, approach,
+                           intervals=intervals)
+
+
+def caches(path):
+    """To get where to keep what is compiled out of the file at path, in order
+
+    __pycache__ next to the file and, where it can not be written, say
+    once installed, pytraffic in the cache directory of the user"""
+
+    user = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+
+    return [os.path.join(os.path.dirname(os.path.abspath(path)), '__pycache__'),
+            os.path.join(user, 'pytraffic')]
+
+
+def load(path, buffer=None, cache=None):
+    """To get the Scenario described by the JSON file at path, compiled
+
+    Conflict intervals are only found given a buffer. What is compiled is
+    kept in the directory cache, by default the first of caches(path) it
+    can be written to, named after a hash of the file, the buffer and
+    VERSION, so it is only worked out again when any of them changes. If
+    it can be written nowhere, it is worked out every time."""
+
+    with open(path, 'rb') as file:
+        content = file.read()
+
+    digest = hashlib.sha256(content)
+    scenario = Scenario(json.loads(content.decode('utf-8')), path, buffer, digest.hexdigest())
+
+    digest.update(json.dumps({'version': VERSION, 'buffer': buffer}).encode('utf-8'))
+
+    name = '{}.{}.scenario'.format(os.path.splitext(os.path.basename(path))[0],
+                                   digest.hexdigest()[:16])
+    directories = caches(path) if cache is None else [cache]
+
+    for directory in directories:
+        compiled = os.path.join(directory, name)
+        if os.path.exists(compiled):
+            _, arrays = checkpoint.read(compiled)
+            scenario.set_arrays(arrays)
+            return scenario
+
+    scenario.compile()
+
+    for directory in directories:
+        compiled = os.path.join(directory, name)
+
+        # Written aside and moved, so processes loading at once never see half a file
+        partial = '{}.{}'.format(compiled, os.getpid())
+        try:
+            os.makedirs(directory, exist_ok=True)
+            checkpoint.write(partial, {'path': path, 'buffer': buffer, 'version': VERSION},
+                             scenario.arrays())
+            os.replace(partial, compiled)
+            break
+
+        except OSError:
+            if os.path.exists(partial):
+                os.remove(partial)
+
+    return scenario
@@ -0,0 +1,69 @@
+"""To schedule periodic events, such as vehicles coming into the road"""
+
+import heapq
+import itertools
+from fractions import Fraction
+
+
+class SpawnScheduler(object):
+    """A single heap of the upcoming instants of many periodic sources
+
+    Time and periods are kept as fractions, so instants are exact and do
+    not drift however long the simulation runs. Each advance costs
+    O(log k) per event due, with k sources, instead of polling them all."""
+
+
+    def __init__(self):
+        self.time = Fraction(0)
+        self.__heap = []
+        self.__order = itertools.count()
+
+
+    def __len__(self):
+        return len(self.__heap)
+
+
+    def add(self, source, period, start=0):
+        """To have source due at start, start + period, start + 2*period..."""
+
+        period = Fraction(period)
+        if period <= 0:
+            raise ValueError('period must be positive')
+
+        heapq.heappush(self.__heap, (Fraction(start), next(self.__order), period, source))
+
+
+    def advance(self, tick):
+        """To move time forward by tick and get the sources due meanwhile
+
+        Due are those with an instant up to the new time, included, in the
+        order of their instants. A source is returned once per instant, so
+        it may come more than once if tick is longer than its period."""
+
+        self.time += Fraction(tick)
+        due = []
+
+        while self.__heap and self.__heap[0][0] <= self.time:
+            instant, order, period, source = self.__heap[0]
+            heapq.heapreplace(self.__heap, (instant + period, order, period, source))
+            due.append(source)
+
+        return due
+
+
+    def entries(self):
+        """To get every source with its next instant and period
+
+        As (instant, period, source) tuples in the order sources were
+        added, which breaks ties between instants, so that another
+        scheduler adding them in this order behaves the same"""
+
+        entries = sorted(self.__heap, key=lambda _: _[1])
+
+        return [(instant, period, source) for instant, order, period, source in entries]
+
+
+    def upcoming(self):
+        """To get the next instant something is due, None if nothing is"""
+
+        return self.__heap[0][0] if self.__heap else None
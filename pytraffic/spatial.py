@@ -0,0 +1,200 @@
+"""Spatial index to find nearby balls without testing every pair"""
+
+import math
+import numpy
+
+
+class SpatialGrid(object):
+    """A uniform grid of square cells laid over the world
+
+    Points are given by arrays of coordinates in meters and are referred
+    to by their index in those arrays. Points outside the world are kept
+    in the border cells, NaN points (balls that exited) are skipped.
+
+    Up to DIRECT points, pairs are found testing all of them at once,
+    cheaper than going through cells when there are only a few. Cells
+    are only worked out once something needs them."""
+
+    DIRECT = 256
+
+
+    def __init__(self, world, cell_size):
+        self.world = world
+        self.cell_size = cell_size
+        self.columns = max(1, math.ceil(world.width / cell_size))
+        self.rows = max(1, math.ceil(world.height / cell_size))
+
+        self.x = numpy.empty(0)
+        self.y = numpy.empty(0)
+        self.__cells = None
+        self.__pairs = None
+        self.__triangle = None
+
+
+    def __cell(self, x, y):
+        column = numpy.clip(numpy.floor(x / self.cell_size), 0, self.columns - 1)
+        row = numpy.clip(numpy.floor(y / self.cell_size), 0, self.rows - 1)
+
+        return column.astype(int), row.astype(int)
+
+
+    def rebuild(self, x, y):
+        """To index all points again, to be called after they move"""
+
+        self.x = numpy.array(x, dtype=float)
+        self.y = numpy.array(y, dtype=float)
+        self.__cells = None
+        self.__pairs = None
+
+
+    def __index(self):
+        """To get the points in every cell, working them out if need be"""
+
+        if self.__cells is not None:
+            return self.__cells
+
+        self.__cells = {}
+
+        index = numpy.flatnonzero(~numpy.isnan(self.x))
+        if not len(index):
+            return self.__cells
+
+        column, row = self.__cell(self.x[index], self.y[index])
+        keys = column * self.rows + row
+
+        order = numpy.argsort(keys, kind='stable')
+        keys, starts = numpy.unique(keys[order], return_index=True)
+
+        self.__cells = dict(zip(keys.tolist(), numpy.split(index[order], starts[1:])))
+
+        return self.__cells
+
+
+    def __span(self, low, high, count):
+        # Clamped as __cell does, so past the border the border cells are covered
+        low = min(count - 1, max(0, math.floor(low / self.cell_size)))
+        high = min(count - 1, max(0, math.floor(high / self.cell_size)))
+
+        return range(low, high + 1)
+
+
+    def neighbours(self, x, y, r):
+        """To get, in increasing order, the indexes of points within r of (x, y)"""
+
+        if x is None or math.isnan(x):
+            return numpy.empty(0, dtype=int)
+
+        cells = self.__index()
+        found = [cells[column * self.rows + row]
+                 for column in self.__span(x - r, x + r, self.columns)
+                 for row in self.__span(y - r, y + r, self.rows)
+                 if column * self.rows + row in cells]
+
+        if not found:
+            return numpy.empty(0, dtype=int)
+
+        index = numpy.concatenate(found)
+        dx = self.x[index] - x
+        dy = self.y[index] - y
+
+        return numpy.sort(index[dx*dx + dy*dy <= r*r])
+
+
+    def pairs(self, r):
+        """To get all pairs of points closer than r as two arrays, i < j
+
+        Pairs come sorted by i and then j. Those within the largest r asked
+        for since the points were indexed are kept, so asking for it first
+        any smaller r only takes filtering them."""
+
+        found = self.__pairs
+        if found is None or found[0] < r:
+            if len(self.x) <= self.DIRECT:
+                i, j = self.__direct_pairs(r)
+            else:
+                i, j = self.__cell_pairs(r)
+
+            dx = self.x[i] - self.x[j]
+            dy = self.y[i] - self.y[j]
+            found = self.__pairs = r, i, j, dx*dx + dy*dy
+
+        radius, i, j, squared = found
+        if radius == r:
+            return i, j
+
+        close = squared < r*r
+        return i[close], j[close]
+
+
+    def __direct_pairs(self, r):
+        count = len(self.x)
+        if self.__triangle is None or self.__triangle[0] != count:
+            self.__triangle = (count,) + numpy.triu_indices(count, 1)
+
+        _, i, j = self.__triangle
+        dx = self.x[i] - self.x[j]
+        dy = self.y[i] - self.y[j]
+
+        # NaN points are never close
+        close = dx*dx + dy*dy < r*r
+        return i[close], j[close]
+
+
+    def __cell_pairs(self, r):
+        reach = math.ceil(r / self.cell_size)
+        found_i = []
+        found_j = []
+
+        cells = self.__index()
+
+        for key, index in cells.items():
+            column, row = divmod(key, self.rows)
+
+            for other_column in range(column, min(self.columns, column + reach + 1)):
+                for other_row in range(max(0, row - reach), min(self.rows, row + reach + 1)):
+
+                    # Visit each couple of cells once
+                    if other_column == column and other_row < row:
+                        continue
+
+                    other = cells.get(other_column * self.rows + other_row)
+                    if other is None:
+                        continue
+
+                    dx = self.x[index][:, None] - self.x[other][None, :]
+                    dy = self.y[index][:, None] - self.y[other][None, :]
+                    close = dx*dx + dy*dy < r*r
+
+                    i, j = numpy.nonzero(close)
+                    i = index[i]
+                    j = other[j]
+
+                    found_i.append(numpy.minimum(i, j)[i != j])
+                    found_j.append(numpy.maximum(i, j)[i != j])
+
+        if not found_i:
+            return numpy.empty(0, dtype=int), numpy.empty(0, dtype=int)
+
+        i = numpy.concatenate(found_i)
+        j = numpy.concatenate(found_j)
+
+        # Within a cell every couple shows up twice
+        unique = numpy.unique(i * len(self.x) + j)
+
+        return unique // len(self.x), unique % len(self.x)
+
+
+    def intersecting_pairs(self, radius):
+        """To get all pairs of balls that overlap, given the radius of each one"""
+
+        radius = numpy.asarray(radius, dtype=float)
+        if not len(radius):
+            return self.pairs(0)
+
+        i, j = self.pairs(2 * numpy.nanmax(radius))
+
+        dx = self.x[i] - self.x[j]
+        dy = self.y[i] - self.y[j]
+        overlap = dx*dx + dy*dy < (radius[i] + radius[j])**2
+
+        return i[overlap], j[overlap]
@@ -0,0 +1,231 @@
+"""To trace a simulation into columnar files without holding it up
+
+Every table is a set of columns, each one a file of raw values appended
+to in chunks of a fixed number of rows, described by METADATA in the
+same directory. Chunks are filled in memory and written by a background
+thread, and read gives them back as memory mapped arrays.
+
+States are recorded as often as the simulation traces them. The multiple
+example traces every vehicle every tick, but with more than one tick per
+step the vehicles out of reach of others only at the end of the step."""
+
+import os
+import json
+import queue
+import threading
+import numpy
+
+
+METADATA = 'telemetry.json'
+
+# Where every vehicle is, every time the simulation is traced
+STATES = (('time', '<f8'), ('serial', '<i8'), ('trajectory', '<i4'), ('position', '<f8'),
+          ('speed', '<f8'), ('x', '<f8'), ('y', '<f8'))
+
+# What happens to vehicles, kind indexes KINDS and other is -1 unless they collide
+EVENTS = (('time', '<f8'), ('kind', '<i1'), ('serial', '<i8'), ('other', '<i8'))
+
+KINDS = ('spawn', 'exit', 'collision')
+
+
+class Table(object):
+    """Rows of columns, as (name, dtype) pairs, filled a chunk at a time
+
+    Full chunks are handed to write, a callable taking the table, the
+    chunk and its number of rows, and must come back through release to
+    be filled again. At most chunks of them are allocated, so if writing
+    falls behind appending waits rather than taking more memory."""
+
+
+    def __init__(self, name, columns, rows, chunks, write):
+        self.name = name
+        self.columns = columns
+        self.rows = rows
+        self.appended = 0
+
+        self.__write = write
+        self.__chunks = chunks
+        self.__allocated = 0
+        self.__free = queue.Queue()
+        self.__chunk = None
+        self.__filled = 0
+
+
+    def __take(self):
+        if self.__free.empty() and self.__allocated < self.__chunks:
+            self.__allocated += 1
+            return {name: numpy.empty(self.rows, dtype) for name, dtype in self.columns}
+
+        return self.__free.get()
+
+
+    def release(self, chunk):
+        """To have a chunk handed to write filled again"""
+
+        self.__free.put(chunk)
+
+
+    def append(self, **values):
+        """To append rows given every column as an array, or a value for all rows"""
+
+        values = {name: numpy.asarray(value) for name, value in values.items()}
+        sizes = [_.size for _ in values.values() if _.ndim]
+        count = sizes[0] if sizes else 1
+        done = 0
+
+        while done < count:
+            if self.__chunk is None:
+                self.__chunk = self.__take()
+                self.__filled = 0
+
+            number = min(count - done, self.rows - self.__filled)
+            for name, _ in self.columns:
+                value = values[name]
+                self.__chunk[name][self.__filled:self.__filled + number] = (
+                    value[done:done + number] if value.ndim else value)
+
+            self.__filled += number
+            done += number
+
+            if self.__filled == self.rows:
+                self.flush()
+
+        self.appended += count
+
+
+    def flush(self):
+        """To hand the rows appended so far to write, even if not a full chunk"""
+
+        if self.__chunk is not None and self.__filled:
+            self.__write(self, self.__chunk, self.__filled)
+            self.__chunk = None
+
+
+class Telemetry(object):
+    """To record vehicle states and events into files in directory
+
+    The simulation only copies its columns into chunks of rows rows, a
+    background thread writes them. header, JSON serialisable, goes into
+    METADATA for readers, say with the names of the trajectories."""
+
+
+    def __init__(self, directory, rows=65536, chunks=4, header=None):
+        self.directory = directory
+        self.chunks = 0
+
+        self.__error = None
+        self.__queue = queue.Queue()
+        self.tables = {name: Table(name, columns, rows, chunks, self.__hand)
+                       for name, columns in (('states', STATES), ('events', EVENTS))}
+
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, METADATA), 'w') as file:
+            json.dump({'tables': {name: table.columns for name, table in self.tables.items()},
+                       'rows': rows,
+                       'kinds': KINDS,
+                       'header': header}, file, indent=2)
+
+        self.__files = {(name, column): open(os.path.join(directory, '{}.{}'.format(name, column)), 'wb')
+                        for name, table in self.tables.items() for column, _ in table.columns}
+
+        self.__worker = threading.Thread(target=self.__work, daemon=True)
+        self.__worker.start()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def __hand(self, table, chunk, rows):
+        self.__queue.put((table, chunk, rows))
+
+
+    def __work(self):
+        while True:
+            item = self.__queue.get()
+            if item is None:
+                return
+
+            table, chunk, rows = item
+
+            # Chunks always go back, or appending would wait for them forever
+            try:
+                if self.__error is None:
+                    for column, _ in table.columns:
+                        file = self.__files[table.name, column]
+                        chunk[column][:rows].tofile(file)
+                        file.flush()
+
+                    self.chunks += 1
+
+            except Exception as error:
+                self.__error = error
+
+            finally:
+                table.release(chunk)
+
+
+    def states(self, time, serial, trajectory, position, speed, x, y):
+        """To record where every vehicle is, one row each, at time"""
+
+        self.tables['states'].append(time=time, serial=serial, trajectory=trajectory,
+                                     position=position, speed=speed, x=x, y=y)
+
+
+    def event(self, kind, time, serials, others=-1):
+        """To record that kind, one of KINDS, happened to vehicles at time"""
+
+        if len(serials):
+            self.tables['events'].append(time=time, kind=KINDS.index(kind), serial=serials,
+                                         other=others)
+
+
+    def close(self):
+        """To write whatever is left and stop the writer
+
+        Raises the first error writing met, if any, once all is done"""
+
+        for table in self.tables.values():
+            table.flush()
+
+        self.__queue.put(None)
+        self.__worker.join()
+
+        for file in self.__files.values():
+            file.close()
+
+        if self.__error is not None:
+            raise self.__error
+
+
+    def __str__(self):
+        return '{} states and {} events recorded in {} chunks'.format(
+            self.tables['states'].appended, self.tables['events'].appended, self.chunks)
+
+
+def read(directory):
+    """To get the metadata and tables written to directory
+
+    Tables are dicts of read only memory mapped columns, as many rows as
+    every column of the table holds, so a trace still being written or cut
+    short reads up to the last chunk written whole."""
+
+    with open(os.path.join(directory, METADATA)) as file:
+        metadata = json.load(file)
+
+    tables = {}
+    for table, columns in metadata['tables'].items():
+        paths = [(column, numpy.dtype(dtype), os.path.join(directory, '{}.{}'.format(table, column)))
+                 for column, dtype in columns]
+        rows = min(os.path.getsize(path) // dtype.itemsize for _, dtype, path in paths)
+
+        # Files can not map empty
+        tables[table] = {column: numpy.memmap(path, dtype, 'r', shape=(rows,))
+                         if rows else numpy.empty(0, dtype)
+                         for column, dtype, path in paths}
+
+    return metadata, tables
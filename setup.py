@@ -4,6 +4,7 @@ from setuptools import setup
 setup (name="pytraffic",
        version="0.1",
        packages=['pytraffic'],
-       package_data={'pytraffic':  ['examples/*.py', 'examples/*.png']},
+       package_data={'pytraffic':  ['examples/*.py', 'examples/*.png', 'examples/*.json']},
        include_package_data=True,
-       install_requires=['pygame', 'docopt', 'numpy'])
+       install_requires=['docopt', 'numpy'],
+       extras_require={'render': ['pygame']})
@@ -0,0 +1,19 @@
+from pytraffic.entities import Trajectory, Line, Point
+from pytraffic.conflicts import conflict_intervals
+
+
+def test_far_apart_trajectories_do_not_conflict():
+    first = Trajectory(Line(Point(0, 20), Point(3000, 20)))
+    second = Trajectory(Line(Point(3000, 180), Point(0, 180)))
+
+    assert conflict_intervals(first, second, 2) == []
+
+
+def test_crossing_trajectories_conflict_around_the_crossing():
+    first = Trajectory(Line(Point(0, 50), Point(100, 50)))
+    second = Trajectory(Line(Point(40, 0), Point(40, 100)))
+
+    [((start_a, end_a), (start_b, end_b))] = conflict_intervals(first, second, 2)
+
+    assert start_a <= 38 and 42 <= end_a <= 43
+    assert start_b <= 48 and 52 <= end_b <= 53
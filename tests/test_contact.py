@@ -0,0 +1,52 @@
+import numpy
+
+from pytraffic.entities import BallState, Ball, Trajectory, Line, Point
+from pytraffic.contact import times_of_contact
+
+
+def crossing_balls(apart, side_by_side=False):
+    """To get a state with two balls of radius 1 crossing each other in
+    opposite lanes apart meters away, starting 10 meters apart along them,
+    or going side by side in parallel lanes"""
+
+    state = BallState()
+    east = Trajectory(Line(Point(0, 50), Point(100, 50)))
+    if side_by_side:
+        other = Trajectory(Line(Point(0, 50 + apart), Point(100, 50 + apart)))
+        positions = 50, 50
+    else:
+        other = Trajectory(Line(Point(100, 50 + apart), Point(0, 50 + apart)))
+        positions = 45, 45
+
+    for trajectory, position in zip((east, other), positions):
+        ball = Ball(1, trajectory, state=state)
+        ball.position = position
+        ball.speed = 500
+
+    state.update_centers()
+
+    return state
+
+
+def contact_time(state, tick):
+    start = state.position.copy()
+    i, j = numpy.array([0]), numpy.array([1])
+
+    return times_of_contact(state, start, tick, i, j)[0]
+
+
+def test_balls_going_through_each_other_touch():
+    # Each one goes 10 meters in the tick, from 10 meters apart to 10 meters past
+    time = contact_time(crossing_balls(0), 0.02)
+
+    assert 0.005 < time < 0.01
+
+
+def test_balls_passing_close_do_not_touch():
+    assert numpy.isnan(contact_time(crossing_balls(2.0005), 0.02))
+    assert not numpy.isnan(contact_time(crossing_balls(1.99), 0.02))
+
+
+def test_balls_side_by_side_touch_only_when_overlapping():
+    assert numpy.isnan(contact_time(crossing_balls(2.0005, side_by_side=True), 0.02))
+    assert contact_time(crossing_balls(1.9995, side_by_side=True), 0.02) == 0
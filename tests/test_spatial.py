@@ -0,0 +1,35 @@
+import numpy
+
+from pytraffic.entities import World
+from pytraffic.spatial import SpatialGrid
+
+
+def test_neighbours_outside_the_world():
+    grid = SpatialGrid(World(188, 125.88), 10)
+    grid.rebuild([10, 50, 100, 200, 203], [10, 60, 120, 130, 130])
+
+    assert grid.neighbours(200, 130, 5).tolist() == [3, 4]
+    assert grid.neighbours(-50, -50, 5).tolist() == []
+
+    i, j = grid.pairs(5)
+    assert list(zip(i.tolist(), j.tolist())) == [(3, 4)]
+
+
+def test_pairs_through_cells_match_all_pairs():
+    rng = numpy.random.default_rng(0)
+    x = rng.uniform(-20, 208, SpatialGrid.DIRECT + 100)
+    y = rng.uniform(-20, 145, len(x))
+
+    grid = SpatialGrid(World(188, 125.88), 10)
+    grid.rebuild(x, y)
+    i, j = grid.pairs(12)
+
+    distance = numpy.hypot(x[:, None] - x[None, :], y[:, None] - y[None, :])
+    expected_i, expected_j = numpy.nonzero(numpy.triu(distance < 12, 1))
+
+    assert i.tolist() == expected_i.tolist()
+    assert j.tolist() == expected_j.tolist()
+
+    for point in range(len(x)):
+        found = grid.neighbours(x[point], y[point], 12)
+        assert found.tolist() == numpy.flatnonzero(distance[point] <= 12).tolist()
@@ -0,0 +1,36 @@
+from math import pi
+
+import numpy
+
+from pytraffic.entities import Trajectory, Line, Arc, Point
+
+
+def crossing():
+    return Trajectory(Line(Point(0, 69.18), Point(98.76, 69.18)),
+                      Arc(Point(98.76, 65.88), 3.5, (3*pi/2, 2*pi)),
+                      Line(Point(101.76, 65.88), Point(101.76, 0)))
+
+
+def test_scalar_length_on_a_tabulated_trajectory():
+    trajectory = crossing()
+    exact = [trajectory.poses(_) for _ in (50.0, 100.0, 1000.0)]
+
+    trajectory.tabulate(0.25)
+
+    for length, expected in zip((50.0, 100.0, 1000.0), exact):
+        poses = trajectory.poses(length)
+        x, y = trajectory.points(length)
+        heading_x, heading_y = trajectory.headings(length)
+
+        assert all(numpy.shape(_) == () for _ in poses + (x, y, heading_x, heading_y))
+        numpy.testing.assert_allclose(poses, expected, atol=1e-3)
+        numpy.testing.assert_allclose((x, y, heading_x, heading_y), poses)
+
+
+def test_tabulated_results_keep_the_shape_of_lengths():
+    trajectory = crossing()
+    trajectory.tabulate(0.25)
+
+    lengths = numpy.array([[0.0, 50.0, 100.0], [150.0, 170.0, 1000.0]])
+
+    assert all(_.shape == lengths.shape for _ in trajectory.poses(lengths))